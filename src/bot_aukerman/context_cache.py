@@ -0,0 +1,147 @@
+"""
+Cache of chatbot context snapshots keyed by the script prefix they encode.
+
+Restoring a snapshot lets a chatbot skip re-encoding the working script after
+a reset, rewind or branch; only the lines after the snapshot's prefix need to
+be added to its context.
+"""
+
+import sys
+from collections import OrderedDict
+from typing import Optional, List, Tuple
+
+class ContextSnapshot:
+    chatbot_index: int
+
+    # Number of working_script components the snapshot's context covers
+    length: int
+
+    # Hash of the working_script prefix of that length
+    prefix_hash: int
+
+    context: object
+    size: int
+
+    # Index of the first component in the context (see
+    # ContextWindow.context_start); None if unknown
+    context_start: Optional[int]
+
+    def __init__(self, chatbot_index, length, prefix_hash, context, size,
+                 context_start = None):
+        self.chatbot_index = chatbot_index
+        self.length = length
+        self.prefix_hash = prefix_hash
+        self.context = context
+        self.size = size
+        self.context_start = context_start
+
+class ContextCache:
+    """
+    LRU store of chatbot context snapshots, evicted by estimated memory use.
+    """
+
+    # Maximum estimated size of all snapshots, in bytes
+    budget: int
+
+    # Estimated size of all snapshots, in bytes
+    total_size: int = 0
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.snapshots: OrderedDict[Tuple[int, int], ContextSnapshot] \
+                = OrderedDict()
+
+    def store(self,
+              chatbot_index: int,
+              length: int,
+              prefix_hash: int,
+              context,
+              context_start: Optional[int] = None):
+        """
+        Store a chatbot's context after it has seen length script components
+        (starting from component context_start, if windowed).
+        """
+
+        key = (chatbot_index, prefix_hash)
+
+        # Replace any existing snapshot for the same prefix
+        if key in self.snapshots:
+            self.total_size -= self.snapshots.pop(key).size
+
+        size = estimate_size(context)
+
+        # Don't flush the whole cache for a snapshot that can't fit
+        if size > self.budget:
+            return
+
+        self.snapshots[key] = ContextSnapshot(chatbot_index,
+                                              length,
+                                              prefix_hash,
+                                              context,
+                                              size,
+                                              context_start)
+        self.total_size += size
+
+        # Evict least recently used snapshots until within budget
+        while self.total_size > self.budget:
+            _, evicted = self.snapshots.popitem(last = False)
+            self.total_size -= evicted.size
+
+    def find(self,
+             chatbot_index: int,
+             prefix_hashes: List[int],
+             max_length: int
+             ) -> Optional[ContextSnapshot]:
+        """
+        Find the longest snapshot for a chatbot whose prefix matches the
+        current script and is shorter than max_length components.
+
+        prefix_hashes[i] is the hash of the script's first i + 1 components.
+        """
+
+        best = None
+
+        for snapshot in self.snapshots.values():
+            if snapshot.chatbot_index != chatbot_index:
+                continue
+
+            if snapshot.length >= max_length \
+                    or snapshot.length > len(prefix_hashes):
+                continue
+
+            if best and snapshot.length <= best.length:
+                continue
+
+            if prefix_hashes[snapshot.length - 1] == snapshot.prefix_hash:
+                best = snapshot
+
+        # Mark as recently used
+        if best:
+            self.snapshots.move_to_end((chatbot_index, best.prefix_hash))
+
+        return best
+
+    def clear(self):
+        self.snapshots.clear()
+        self.total_size = 0
+
+def estimate_size(context, depth: int = 2) -> int:
+    """
+    Estimate the memory used by a chatbot context, in bytes.
+    """
+
+    # numpy arrays, tensors and similar
+    nbytes = getattr(context, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+
+    size = sys.getsizeof(context)
+
+    if depth > 0:
+        if isinstance(context, (list, tuple)):
+            size += sum(estimate_size(item, depth - 1) for item in context)
+        elif isinstance(context, dict):
+            size += sum(estimate_size(item, depth - 1)
+                        for item in context.values())
+
+    return size
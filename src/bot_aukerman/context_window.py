@@ -0,0 +1,173 @@
+"""
+Token-budgeted window over a performance's working script.
+
+Long performances eventually outgrow a chatbot's context, so prompts only
+include as many of the newest script components as fit in a token budget,
+plus the most recent scene header.
+"""
+
+from bisect import bisect_left, bisect_right
+from typing import Callable, Optional, Tuple
+
+from .working_script import SharedPrefixList
+
+class ContextWindow:
+    """
+    Counts the tokens of each working_script component once and picks which
+    components fit in a token budget.
+    """
+
+    performance = None #@TODO type hinting causes circular import
+
+    # Token counting function
+    count_tokens: Callable[[str], int]
+
+    # token_offsets[i] is the number of tokens in components 0 to i - 1
+    token_offsets: SharedPrefixList
+
+    # Indices of SceneHeader components
+    scene_header_indices: SharedPrefixList
+
+    # Index of the first component in the chatbot's current context; None if
+    # unknown (e.g. restored from a snapshot)
+    context_start: Optional[int] = None
+
+    def __init__(self, performance, count_tokens: Callable[[str], int]):
+        self.performance = performance
+        self.count_tokens = count_tokens
+        self.token_offsets = SharedPrefixList([0])
+        self.scene_header_indices = SharedPrefixList()
+
+    def fork(self, performance) -> "ContextWindow":
+        """
+        Make a window for a fork of the performance, sharing counts so far.
+        """
+
+        window = ContextWindow(performance, self.count_tokens)
+        window.token_offsets = self.token_offsets.fork()
+        window.scene_header_indices = self.scene_header_indices.fork()
+        window.context_start = self.context_start
+
+        return window
+
+    def adopt(self, window: "ContextWindow"):
+        """
+        Catch up with the window of a fork of the performance being committed.
+
+        Counts the fork's window made on top of this one are copied over, so
+        this window's lists stay flat however many forks are committed.
+        """
+
+        token_offsets = window.token_offsets
+        scene_header_indices = window.scene_header_indices
+
+        if token_offsets.base is self.token_offsets \
+                and token_offsets.base_length == len(self.token_offsets) \
+                and scene_header_indices.base is self.scene_header_indices \
+                and scene_header_indices.base_length \
+                        == len(self.scene_header_indices):
+            self.token_offsets.extend(token_offsets.items)
+            self.scene_header_indices.extend(scene_header_indices.items)
+
+        # Count anything else (e.g. if the fork truncated its window)
+        self.update()
+
+        self.context_start = window.context_start
+
+    def truncated(self, length: int) -> "ContextWindow":
+        """
+        Get a window over the first length components, sharing counts with
+        this one.
+        """
+
+        window = ContextWindow(self.performance, self.count_tokens)
+
+        window.token_offsets = self.token_offsets.truncated(length + 1)
+
+        num_scene_headers = bisect_left(self.scene_header_indices, length)
+        window.scene_header_indices = \
+                self.scene_header_indices.truncated(num_scene_headers)
+
+        if self.context_start is not None and self.context_start <= length:
+            window.context_start = self.context_start
+
+        return window
+
+    def update(self):
+        """
+        Count tokens of components added since the last update.
+        """
+
+        working_script = self.performance.working_script
+        rendered_components = self.performance.rendered_components
+
+        for index in range(len(self.token_offsets) - 1,
+                           len(rendered_components)):
+            num_tokens = self.count_tokens(rendered_components[index])
+            self.token_offsets.append(self.token_offsets[-1] + num_tokens)
+
+            if working_script.get_component_type(index) == "scene_header":
+                self.scene_header_indices.append(index)
+
+    def count_range(self, start: int, stop: int) -> int:
+        """
+        Count the tokens of components start to stop - 1.
+        """
+
+        self.update()
+
+        return self.token_offsets[stop] - self.token_offsets[start]
+
+    def select(self, budget: int) -> Tuple[int, Optional[int]]:
+        """
+        Pick the components to include in a prompt.
+
+        Returns
+        -------
+        start : int
+            Index of the oldest component to include; components from start to
+            the end of the script, with the scene header if any, fit in budget
+            (the newest component is always included).
+
+        scene_header_index : int or None
+            Index of the scene header to include before start, if the current
+            scene began before start.
+        """
+
+        self.update()
+
+        num_components = len(self.token_offsets) - 1
+        total_tokens = self.token_offsets[-1]
+
+        if total_tokens <= budget:
+            return 0, None
+
+        # Reserve room for the scene header; moving start forward to make room
+        # may uncover a later, larger header, so the reservation only grows
+        # until the header before start fits in it
+        header_budget = 0
+        while True:
+            start = bisect_left(self.token_offsets,
+                                total_tokens - (budget - header_budget))
+            start = min(start, num_components - 1)
+
+            header_position = bisect_right(self.scene_header_indices, start - 1)
+            if header_position == 0:
+                return start, None
+
+            scene_header_index = self.scene_header_indices[header_position - 1]
+            header_tokens = self.count_range(scene_header_index,
+                                             scene_header_index + 1)
+
+            if header_tokens <= header_budget:
+                return start, scene_header_index
+
+            header_budget = header_tokens
+
+def approximate_token_count(text: str) -> int:
+    """
+    Roughly count tokens for chatbots that don't expose a tokenizer.
+    """
+
+    #@REVISIT ~4 characters per token for English text with GPT-style BPE
+    return len(text) // 4 + 1
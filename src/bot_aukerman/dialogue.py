@@ -1,12 +1,23 @@
+import sys
+from typing import Optional
+
 # from .interpreter import Interpreter
 from .script_component import ScriptComponent
 from .logging import warn
 
 class Dialogue(ScriptComponent):
+    __slots__ = ("character_name", "dialogue", "upper_character_name")
+
+    component_type = "dialogue"
+
+    # Interned, so dialogue by the same character shares one name string
     character_name: str
     dialogue: str
     # parenthetical: str
 
+    # character_name.upper(), computed on first render
+    upper_character_name: Optional[str]
+
     # # Static enum for formats
     # Format = Enum("Format", ["SINGLE_LINE", "MULTI_LINE"])
 
@@ -16,8 +27,9 @@ class Dialogue(ScriptComponent):
     def __init__(self, character_name, dialogue = ""):
         super().__init__()
 
-        self.character_name = character_name
+        self.character_name = sys.intern(character_name)
         self.dialogue = dialogue
+        self.upper_character_name = None
         # self.parenthetical = parenthetical
 
     def to_str(self, multi_line = True):
@@ -25,13 +37,18 @@ class Dialogue(ScriptComponent):
         # if(self.parenthetical):
         #     parenthetical = f"({self.parenthetical})"
 
+        upper_character_name = self.upper_character_name
+        if upper_character_name is None:
+            upper_character_name = self.character_name.upper()
+            self.upper_character_name = upper_character_name
+
         if(multi_line):
-            return f"{self.character_name.upper()}\n{self.dialogue}"
+            return f"{upper_character_name}\n{self.dialogue}"
             # if(parenthetical):
             #     parenthetical = "\n" + parenthetical
             # return f"{self.character_name}{parenthetical}\n{self.dialogue}"
         else:
-            return f"{self.character_name.upper()}: " + self.dialogue.join("\n")
+            return f"{upper_character_name}: " + self.dialogue.join("\n")
             # return f"{self.character_name}{parenthetical}: {self.dialogue}"
 
     def __str__(self):
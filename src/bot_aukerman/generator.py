@@ -1,19 +1,20 @@
-from typing import List, Optional, Callable
+from typing import List, Optional, Callable, Iterable
 import random
-from importlib import resources
-import re
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 from .script_component import ScriptComponent
 from .dialogue import Dialogue
 # from .performance import Performance #@TODO type hinting causes circular import
 from .performer import Performer
 from .bot_performer import BotPerformer
-from .human_performer import HumanPerformer
 from .interpreter import Interpreter
 
 from .constants import ScriptFormat, ScriptComponentType
 from .logging import warn
 
+from .model_profiles import ModelProfile, get_model_profile
+from .model_registry import model_registry
+
 from llmber import AutoChatbot
 
 class Generator():
@@ -25,16 +26,13 @@ class Generator():
 
     performance = None #@TODO type hinting causes circular import
 
-    script_format: ScriptFormat = ScriptFormat.FOUNTAIN
-
-    component_filters: List[Callable] = []
-
     def __init__(self, performance):
         self.performance = performance
-        self.script_format = performance.script_format
 
-        #@TODO make optional
-        self.component_filters.append(self.filter_non_alphabetical)
+    @property
+    def script_format(self) -> ScriptFormat:
+        # Read through so a long-lived Generator follows format changes
+        return self.performance.script_format
 
     #@REVISIT really not sure about this architecture; mostly just doing it to
     #@ stay consistent with Interpreter that uses the same concept; but we might
@@ -43,7 +41,8 @@ class Generator():
     def generate(cls,
                  performance,
                  num_lines: int = 1,
-                 character_idx: Optional[int] = None
+                 character_idx: Optional[int] = None,
+                 on_component: Optional[Callable] = None
                  ) -> List[Dialogue]:
         """
         Generate a script for a performance.
@@ -53,6 +52,11 @@ class Generator():
         performance : Performance
             The performance to generate a script for.
 
+        on_component : callable, optional
+            Called with each valid script component as soon as it has been
+            generated; before generation of the remaining lines finishes when
+            the chatbot supports streaming.
+
         Returns
         -------
         script : list of ScriptComponent
@@ -64,17 +68,22 @@ class Generator():
 
         # Generate script
         components = generator.generate_dialogue(num_lines=num_lines,
-                                                 character_idx=character_idx)
+                                                 character_idx=character_idx,
+                                                 on_component=on_component)
 
         return components
 
     def generate_dialogue(self,
                           num_lines = 1,
-                          character_idx: Optional[int] = None
+                          character_idx: Optional[int] = None,
+                          on_component: Optional[Callable] = None
                           ) -> List[Dialogue]:
         """
         Generate dialogue for a performance, optionally for a specific bot
         character.
+
+        Generated components are added to the performance's working script as
+        each request completes, so later requests in the same call see them.
         """
 
         components = [] #@REVISIT architecture
@@ -89,29 +98,104 @@ class Generator():
             # Generate num_lines for specified bot character
             bot_performer = self.performance.bot_performers[character_idx]
             components = self.generate_performer_lines(bot_performer,
-                                                       num_lines)
+                                                       num_lines,
+                                                       on_component)
+
+            self.performance.add_components(components)
+
             return components
 
         # If no character_idx is supplied, generate dialogue for a random bot
         else:
-            components = []
-
-            # Generate num_lines for random bot characters
-            #@TODO combine requests when possible (i.e. loop through characters
-            # and determine who shares chatbots, send minimal chatbot queries)
-            for line_index in range(num_lines): #@REVISIT architecture
+            # Generate num_lines for random bot characters; bots that share a
+            # chatbot have their lines generated together in one request
+            while len(components) < num_lines:
                 bot_performer = self.pick_next_bot_performer()
 
-                # Generate dialogue for that performer
+                # Determine who else this performer's chatbot can speak for
+                batch_characters = self.get_batch_characters(bot_performer)
+                if batch_characters:
+                    batch_num_lines = num_lines - len(components)
+                else:
+                    batch_num_lines = 1
+
+                # Generate dialogue for that performer (and maybe others)
                 if __debug__:
                     print("Generating dialogue for", bot_performer.character_name)
 
-                component = self.generate_performer_lines(bot_performer,
-                                                          num_lines=1)
-                components.extend(component)
+                batch = self.generate_performer_lines(bot_performer,
+                                                      num_lines=batch_num_lines,
+                                                      on_component=on_component,
+                                                      characters=batch_characters)
+
+                #@REVISIT shouldn't happen; generate_performer_lines raises
+                if not batch:
+                    break
+
+                self.performance.add_components(batch)
+                components.extend(batch)
+
+            return components
+
+    def get_batch_characters(self, performer: BotPerformer) -> Optional[set]:
+        """
+        Get the names of the bot characters whose lines can be generated in
+        the same chatbot request as performer's, or None if only performer's
+        line should be requested.
+
+        Lines are batched when performer's chatbot is shared with other bot
+        performers, or when performer is the only bot performer.
+        """
+
+        bot_performers = self.performance.bot_performers
+
+        shared_performers = [
+            bot_performer for bot_performer in bot_performers
+            if bot_performer.chatbot_index == performer.chatbot_index
+        ]
+
+        if len(shared_performers) > 1 or len(bot_performers) == 1:
+            return {
+                bot_performer.character_name.upper()
+                for bot_performer in shared_performers
+            }
+
+        return None
+
+    def attribute_components(self,
+                             components: List[ScriptComponent],
+                             characters: Optional[set] = None,
+                             ) -> List[ScriptComponent]:
+        """
+        Return the leading components that are dialogue for one of characters.
+
+        Everything from the first line spoken by anyone else (e.g. a human
+        performer) is dropped, since later lines would be responding to it.
+        """
 
+        if characters is None:
             return components
 
+        for component_index, component in enumerate(components):
+            if not self.is_attributed(component, characters):
+                return components[:component_index]
+
+        return components
+
+    def is_attributed(self,
+                      component: ScriptComponent,
+                      characters: Optional[set] = None,
+                      ) -> bool:
+        """
+        Whether component is dialogue for one of characters (any dialogue if
+        characters is None).
+        """
+
+        if characters is None:
+            return True
+
+        return isinstance(component, Dialogue) \
+                and component.character_name.upper() in characters
 
     def pick_next_bot_performer(self) -> BotPerformer:
         """
@@ -130,8 +214,8 @@ class Generator():
 
         # Remove the last performer from the list of bot performers if bot
         #@REVISIT architecture
-        if self.performance.character_history:
-            last_character_name = self.performance.character_history[-1]
+        last_character_name = self.performance.working_script.get_last_speaker()
+        if last_character_name:
             if last_character_name not in self.performance.performers:
                 #@TODO handle this better; maybe add character to performers?
 
@@ -161,7 +245,9 @@ class Generator():
 
     def generate_performer_lines(self,
                                  performer,
-                                 num_lines = 1
+                                 num_lines = 1,
+                                 on_component: Optional[Callable] = None,
+                                 characters: Optional[set] = None
                                  ) -> List[Dialogue]:
         """
         Generate dialogue for a performer.
@@ -178,6 +264,15 @@ class Generator():
             The maximum number of lines to generate. If 0, generate as many
             lines as possible.
 
+        on_component : callable, optional
+            Called with each valid script component as soon as it has been
+            generated.
+
+        characters : set of str, optional
+            Uppercase names of the characters to accept lines for; generation
+            stops at the first line spoken by anyone else. If None, lines for
+            any character are accepted.
+
         Returns
         -------
         lines : list of Dialogue
@@ -193,23 +288,9 @@ class Generator():
         # Get chatbot used for performer
         chatbot = self.get_performer_chatbot(performer)
 
-        #@SCAFFOLDING
-        stop_sequences = []
-        if num_lines == 1:
-            # If chatbot is remote
-            if chatbot.is_remote:
-                # Assume regex not supported, just stop gen on double newline
-                #@REVISIT!
-                stop_sequences.append("\n\n")
-
-            # If chatbot is local
-            else:
-                # Stop gen on double newline after non-whitespace character
-                stop_sequences.append({
-                    "type": "regex",
-                    "value": r"[\S]+\n\n"
-                })
-
+        # Get stop sequences from chatbot's profile
+        stop_sequences = self.get_model_profile(chatbot) \
+                .get_stop_sequences(chatbot.is_remote, num_lines)
 
         if not chatbot:
             raise Exception("No chatbot for performer or performance; " \
@@ -225,29 +306,64 @@ class Generator():
 
         valid_generation = False #@REVISIT naming
         context = chatbot.get_context()
-        working_component = None
+
+        # Cache the context so resets, rewinds and branches can restore it
+        chatbot_state = self.performance.chatbot_states[performer.chatbot_index]
+        if chatbot.keep_context and chatbot_state > 0:
+            context_start = None
+            if self.performance.context_token_budget is not None:
+                context_start = self.performance.get_context_window(
+                        performer.chatbot_index).context_start
+
+            self.performance.context_cache.store(
+                    performer.chatbot_index,
+                    chatbot_state,
+                    self.performance.get_prefix_hash(chatbot_state),
+                    context,
+                    context_start = context_start)
+
         max_attempts = 10
         attempt = 0
         while not valid_generation:
-            # Generate response
-            response = chatbot.request_string(n_tokens = 100,
-                                              stop_sequences = stop_sequences)
-
-            # Log the response
-            self.performance.log("=== Chatbot Response: ===\n" + response \
-                    + "=== END ===\n")
+            # If several candidates requested and chatbot is remote, request
+            # them concurrently and keep the first valid one
+            if self.performance.num_candidates > 1 and chatbot.is_remote:
+                script_components = self.request_candidates(
+                        chatbot = chatbot,
+                        performer = performer,
+                        num_lines = num_lines,
+                        stop_sequences = stop_sequences,
+                        num_candidates = self.performance.num_candidates,
+                        characters = characters)
+
+                if on_component:
+                    for component in script_components:
+                        on_component(component)
+
+            # If chatbot can stream tokens, stop as soon as we have our lines
+            elif self.supports_streaming(chatbot):
+                script_components = self.stream_performer_lines(
+                        chatbot = chatbot,
+                        performer = performer,
+                        num_lines = num_lines,
+                        stop_sequences = stop_sequences,
+                        on_component = on_component,
+                        characters = characters)
 
-            # Parse response into dialogue lines
-            script_components = self.parse_response(response,
-                                                    chatbot=chatbot,
-                                                    next_performer=performer,
-                                                    working_component=working_component,)
+            else:
+                # Generate response
+                response = chatbot.request_string(n_tokens = 100,
+                                                  stop_sequences = stop_sequences)
 
-            # Filter for valid components
-            script_components = self.filter_script_components(script_components)
+                script_components = self.process_response(response,
+                                                          chatbot = chatbot,
+                                                          performer = performer,
+                                                          num_lines = num_lines,
+                                                          characters = characters)
 
-            # Remove any components over limit
-            script_components = script_components[:num_lines]
+                if on_component:
+                    for component in script_components:
+                        on_component(component)
 
             # If no (valid) script components were generated
             if len(script_components) == 0:
@@ -269,6 +385,8 @@ class Generator():
                 if __debug__:
                     warn("invalid generation; trying again")
 
+                continue
+
             # # If last component is partial (only parentheses)
             # last_component = script_components[-1]
             # if isinstance(last_component, Dialogue) and not last_component.dialogue:
@@ -291,6 +409,267 @@ class Generator():
 
         return dialogue_components
 
+    def process_response(self,
+                         response: str,
+                         chatbot: AutoChatbot,
+                         performer: BotPerformer,
+                         num_lines: int = 1,
+                         characters: Optional[set] = None,
+                         ) -> List[ScriptComponent]:
+        """
+        Log, parse and filter a complete chatbot response.
+
+        Returns
+        -------
+        valid_components : list of ScriptComponent
+            The valid script components, at most num_lines of them.
+        """
+
+        # Log the response
+        self.performance.log("=== Chatbot Response: ===\n" + response \
+                + "=== END ===\n")
+
+        # Parse response into dialogue lines
+        script_components = self.parse_response(response,
+                                                chatbot=chatbot,
+                                                next_performer=performer)
+
+        # Filter for valid components
+        script_components = self.filter_script_components(script_components)
+
+        # Keep only lines for the requested characters
+        script_components = self.attribute_components(script_components,
+                                                      characters)
+
+        # Remove any components over limit
+        if num_lines:
+            script_components = script_components[:num_lines]
+
+        return script_components
+
+    def request_candidates(self,
+                           chatbot: AutoChatbot,
+                           performer: BotPerformer,
+                           num_lines: int = 1,
+                           stop_sequences: list = [],
+                           num_candidates: int = 2,
+                           characters: Optional[set] = None,
+                           ) -> List[ScriptComponent]:
+        """
+        Request several candidate responses from a remote chatbot and return
+        the valid components of the first valid one to arrive.
+
+        Each candidate runs on its own instance of the chatbot's engine (see
+        ModelRegistry.acquire()), starting from the chatbot's context, so
+        concurrent requests don't share a context. At most
+        performance.max_concurrent_candidates are in flight; further
+        candidates are only started as earlier ones fail, so none are paid for
+        once a valid one has arrived. Requests already in flight are left to
+        finish and their responses are discarded.
+
+        Returns
+        -------
+        valid_components : list of ScriptComponent
+            The valid script components of the first valid candidate, or an
+            empty list if no candidate was valid.
+        """
+
+        context = chatbot.get_view_context()
+        model_config = chatbot.entry.model_config
+
+        max_concurrent = max(1, min(num_candidates,
+                                    self.performance.max_concurrent_candidates))
+        executor = ThreadPoolExecutor(max_workers = max_concurrent)
+
+        # Candidate views by future of their request
+        pending = {}
+        candidate_views = []
+
+        def start_candidate():
+            view = model_registry.acquire(model_config,
+                                          slot = len(candidate_views) + 1)
+            view.set_view_context(context)
+            view.keep_response_in_context = chatbot.keep_response_in_context
+            candidate_views.append(view)
+
+            future = executor.submit(view.request_string,
+                                     n_tokens = 100,
+                                     stop_sequences = stop_sequences)
+            pending[future] = view
+
+        last_error = None
+        failed_candidates = 0
+
+        try:
+            for _ in range(max_concurrent):
+                start_candidate()
+
+            while pending:
+                done, _ = wait(pending, return_when = FIRST_COMPLETED)
+
+                for future in done:
+                    view = pending.pop(future)
+
+                    try:
+                        response = future.result()
+                    except Exception as e:
+                        warn("candidate request failed:", e)
+                        last_error = e
+                        failed_candidates += 1
+                        response = None
+
+                    if response is not None:
+                        script_components = self.process_response(
+                                response,
+                                chatbot = view,
+                                performer = performer,
+                                num_lines = num_lines,
+                                characters = characters)
+
+                        if script_components:
+                            # Continue from the winning candidate's context
+                            chatbot.set_view_context(view.get_view_context())
+
+                            return script_components
+
+                        if __debug__:
+                            warn("invalid candidate generation")
+
+                    if len(candidate_views) < num_candidates:
+                        start_candidate()
+
+        finally:
+            # Don't wait on candidates still in flight; their engines are
+            # released once they finish
+            executor.shutdown(wait = False)
+
+            for future, view in pending.items():
+                future.add_done_callback(
+                        lambda future, view = view: model_registry.release(view))
+
+            for view in candidate_views:
+                if view not in pending.values():
+                    model_registry.release(view)
+
+        # If every candidate failed, surface the error
+        if last_error and failed_candidates == num_candidates:
+            raise last_error
+
+        return []
+
+    def supports_streaming(self, chatbot) -> bool:
+        """
+        Whether a chatbot can stream its response token by token.
+        """
+
+        return callable(getattr(chatbot, "request_tokens", None))
+
+    def stream_performer_lines(self,
+                               chatbot: AutoChatbot,
+                               performer: BotPerformer,
+                               num_lines: int = 1,
+                               stop_sequences: list = [],
+                               on_component: Optional[Callable] = None,
+                               characters: Optional[set] = None,
+                               ) -> List[ScriptComponent]:
+        """
+        Stream a response from a chatbot, interpreting it as it arrives.
+
+        The request is canceled as soon as num_lines valid components have
+        been closed, or as soon as a closed component is invalid (the response
+        has stopped being dialogue and further tokens would be wasted) or is
+        not dialogue for one of characters.
+
+        Returns
+        -------
+        valid_components : list of ScriptComponent
+            The valid script components, at most num_lines of them.
+        """
+
+        valid_components = []
+        response = ""
+
+        # Prime interpreter with the character name the prompt ends with
+        interpreter = Interpreter.start_stream(self.get_parser_flags(chatbot))
+        interpreter.feed(performer.character_name.upper() \
+                + self.break_character_name())
+
+        token_stream = chatbot.request_tokens(n_tokens = 100,
+                                              stop_sequences = stop_sequences)
+
+        try:
+            finished = False
+            for token in token_stream:
+                # Strip leading whitespace from response
+                if not response:
+                    token = token.lstrip()
+
+                response += token
+
+                components = interpreter.feed(token)
+                finished = self.accept_streamed_components(components,
+                                                           valid_components,
+                                                           num_lines,
+                                                           on_component,
+                                                           characters)
+                if finished:
+                    break
+
+            # If response ended before we had enough lines, close interpreter
+            if not finished:
+                self.accept_streamed_components(interpreter.close(),
+                                                valid_components,
+                                                num_lines,
+                                                on_component,
+                                                characters)
+
+        finally:
+            # Cancel the request if it is still running
+            if hasattr(token_stream, "close"):
+                token_stream.close()
+
+        # Log the response
+        self.performance.log("=== Chatbot Response (streamed): ===\n" \
+                + response + "=== END ===\n")
+
+        return valid_components
+
+    def accept_streamed_components(self,
+                                   components: List[ScriptComponent],
+                                   valid_components: List[ScriptComponent],
+                                   num_lines: int,
+                                   on_component: Optional[Callable] = None,
+                                   characters: Optional[set] = None,
+                                   ) -> bool:
+        """
+        Validate newly streamed components and add them to valid_components.
+
+        Returns True when streaming should stop.
+        """
+
+        for component in components:
+            # If component is invalid, the response has gone off the rails
+            if not self.validate_script_component(component):
+                if __debug__:
+                    warn("invalid streamed component; canceling:", component)
+
+                return True
+
+            # If someone else is speaking, later lines respond to them
+            if not self.is_attributed(component, characters):
+                return True
+
+            valid_components.append(component)
+
+            if on_component:
+                on_component(component)
+
+            # If we have enough lines
+            if num_lines and len(valid_components) >= num_lines:
+                return True
+
+        return False
+
     def filter_script_components(self, script_components):
         """
         Filter script components for valid components.
@@ -335,42 +714,11 @@ class Generator():
         """
 
         #@REVISIT only allow Dialogue?
-        if isinstance(component, Dialogue):
-            return True
-
-        for component_filter in self.component_filters:
-            if not component_filter(component):
-                return False
-
-        return False
-
-    def filter_non_alphabetical(self, component): #@REVISIT naming
-        """
-        Filter out components with no alphabetical characters.
-
-        Parameters
-        ----------
-        component : ScriptComponent
-            The script component to filter.
-
-        Returns
-        -------
-        valid : bool
-            Whether the script component is valid.
-        """
-
-        text: str
-
         if not isinstance(component, Dialogue):
-            # Check if component has any alphabetical characters
-            text = component.to_str()
-        else:
-            text = component.dialogue
-
-        if not re.search(r"[a-zA-Z]", text):
             return False
 
-        return True
+        # Run the performance's filters
+        return self.performance.component_validator(component)
 
     def get_performer_chatbot(self, performer) -> AutoChatbot:
         """
@@ -412,8 +760,23 @@ class Generator():
         # Determine current state of working script
         current_state = len(self.performance.working_script)
 
-        # If chatbot hasn't been initialized or doesn't keep context
         chatbot_state = self.performance.chatbot_states[chatbot_index]
+
+        # If chatbot context is empty, restore the closest cached snapshot
+        if chatbot_state == 0 and chatbot.keep_context:
+            chatbot_state = self.restore_context_snapshot(chatbot_index,
+                                                          current_state)
+
+        # If chatbot's context has outgrown the token budget, rebuild it
+        if chatbot_state > 0 and chatbot.keep_context \
+                and self.context_exceeds_budget(chatbot_index, current_state):
+            if __debug__:
+                print("Chatbot context exceeds token budget; rebuilding...")
+
+            chatbot.clear_context()
+            chatbot_state = 0
+
+        # If chatbot hasn't been initialized or doesn't keep context
         if chatbot_state == 0 or not chatbot.keep_context:
             # Update chatbot state to current state
             self.performance.chatbot_states[chatbot_index] = current_state
@@ -423,7 +786,8 @@ class Generator():
 
             # Prepare chatbot prompt
             prompt = self.prepare_context(chatbot = chatbot,
-                                          num_lines = num_lines)
+                                          num_lines = num_lines,
+                                          chatbot_index = chatbot_index)
 
             # If next_performer is set, prepare a dialogue line for it
             if(next_performer):
@@ -444,9 +808,9 @@ class Generator():
                 if __debug__:
                     print(f"Adding {comps_behind} lines to chatbot prompt...")
 
-                # Add missing lines to prompt
-                missing_lines = self.performance.working_script[chatbot_state:]
-                prompt += self.components_to_str(missing_lines)
+                # Add missing lines (rendered when they were added) to prompt
+                missing_lines = self.performance.rendered_components[chatbot_state:]
+                prompt += "".join(missing_lines)
 
                 # If next_performer is set, prepare a dialogue line
                 if next_performer:
@@ -460,17 +824,105 @@ class Generator():
 
         return prompt
 
+    def context_exceeds_budget(self,
+                               chatbot_index: int,
+                               current_state: int) -> bool:
+        """
+        Whether a chatbot's context holds more script tokens than the
+        performance's context_token_budget.
+        """
+
+        budget = self.performance.context_token_budget
+        if budget is None:
+            return False
+
+        window = self.performance.get_context_window(chatbot_index)
+        context_start = window.context_start or 0
+
+        return window.count_range(context_start, current_state) > budget
+
+    def get_windowed_script(self, chatbot_index: int) -> str:
+        """
+        Get the newest part of working_script that fits the performance's
+        context_token_budget, preceded by the current scene header.
+
+        For chatbots that keep context, only context_rebuild_fraction of the
+        budget is filled, so new lines can be added for a while before the
+        context has to be rebuilt again.
+        """
+
+        budget = self.performance.context_token_budget
+        if budget is None:
+            return self.performance.get_rendered_script()
+
+        if self.performance.chatbots[chatbot_index].keep_context:
+            budget = int(budget * self.performance.context_rebuild_fraction)
+
+        window = self.performance.get_context_window(chatbot_index)
+        start, scene_header_index = window.select(budget)
+        window.context_start = start
+
+        # If whole script fits
+        if start == 0:
+            return self.performance.get_rendered_script()
+
+        rendered_components = self.performance.rendered_components
+        windowed_script = "".join(rendered_components[start:])
+
+        if scene_header_index is not None:
+            windowed_script = rendered_components[scene_header_index] \
+                    + windowed_script
+
+        return windowed_script
+
+    def restore_context_snapshot(self,
+                                 chatbot_index: int,
+                                 current_state: int) -> int:
+        """
+        Restore a chatbot's context from the performance's context cache.
+
+        Uses the longest snapshot of the current working script that leaves at
+        least one component to add, so the prompt ends with a fresh cue for
+        the next performer.
+
+        Returns
+        -------
+        chatbot_state : int
+            The number of components the restored context covers; 0 if no
+            snapshot was found.
+        """
+
+        snapshot = self.performance.context_cache.find(
+                chatbot_index,
+                self.performance.script_prefix_hashes,
+                current_state)
+
+        if not snapshot:
+            return 0
+
+        if __debug__:
+            print("Restoring cached chatbot context covering",
+                  snapshot.length, "lines...")
+
+        chatbot = self.performance.chatbots[chatbot_index]
+        chatbot.set_context(snapshot.context)
+        self.performance.chatbot_states[chatbot_index] = snapshot.length
+
+        # Measure the budget from where the restored context starts
+        if self.performance.context_token_budget is not None:
+            window = self.performance.get_context_window(chatbot_index)
+            window.context_start = snapshot.context_start
+
+        return snapshot.length
+
     @staticmethod
-    def components_to_str(components: List[ScriptComponentType],
+    def components_to_str(components: Iterable[ScriptComponentType],
                           script_format: ScriptFormat = ScriptFormat.FOUNTAIN
                           ) -> str:
-        return_string = ""
+        component_break = Generator.break_component(script_format)
 
-        for i, line in enumerate(components):
-            return_string += line.to_str()
-            return_string += Generator.break_component(script_format)
-
-        return return_string
+        return "".join([component.to_str() + component_break
+                        for component in components])
 
 
     #@REVISIT architecture
@@ -502,42 +954,28 @@ class Generator():
 
     def prepare_context(self,
                         chatbot,
-                        num_lines = 1) -> str:
+                        num_lines = 1,
+                        chatbot_index: Optional[int] = None) -> str:
         """
         Prepare a prompt to give a chatbot to generate dialogue.
         """
 
-        # Retrieve chatbot-specific prompt base
-        prompt_string = self.retrieve_chatbot_prompt_base(chatbot)
+        if chatbot_index is None:
+            chatbot_index = self.performance.chatbots.index(chatbot)
+
+        # Retrieve chatbot-specific prompt template
+        prompt_template = self.get_model_profile(chatbot).template
 
         # Setup search and replace dictionary
-        bot_characters = ""
-        human_characters = ""
-        working_script_string = ""
         extra_directions = ""
 
-        # Iterate through performers
-        for character_name, performer in self.performance.performers.items():
-            # If performer is a bot
-            if isinstance(performer, BotPerformer):
-                # Add newline if not first performer
-                if(bot_characters != ""):
-                    bot_characters += "\n"
-
-                bot_characters += performer.get_description()
-            # If performer is a human
-            elif isinstance(performer, HumanPerformer):
-                # Add newline if not first performer
-                if(human_characters != ""):
-                    human_characters += "\n"
-                human_characters += performer.get_description()
-            else:
-                raise Exception("Invalid performer type.")
+        # Retrieve cached performer descriptions
+        bot_characters, human_characters \
+                = self.performance.get_performer_descriptions()
 
-        # Convert working_script to string
-        for line in self.performance.working_script:
-            working_script_string += line.to_str()
-            working_script_string += self.break_component(self.script_format)
+        # Retrieve incrementally rendered working_script, limited to the
+        # context token budget
+        working_script_string = self.get_windowed_script(chatbot_index)
 
         # If num_lines is set, add it to extra_directions
         if(num_lines):
@@ -553,36 +991,35 @@ class Generator():
             "\n\n{{extra_directions}}": extra_directions
         }
 
-        # Replace placeholders
-        for placeholder in replacements:
-            replacement = replacements[placeholder]
-            prompt_string = prompt_string.replace(placeholder, replacement)
+        # Fill in placeholders
+        prompt_string = prompt_template.render(replacements)
 
         return prompt_string
 
+    def get_model_profile(self, chatbot) -> ModelProfile:
+        """
+        Get the profile (prompt template, parser flags, stop sequences) for a
+        chatbot.
+
+        Looked up on each request rather than held by the Generator, so a
+        performer whose chatbot is swapped gets the new chatbot's profile.
+        """
+
+        return get_model_profile(chatbot.name)
 
     def retrieve_chatbot_prompt_base(self, chatbot) -> str:
         """
-        Load a prompt base for a chatbot from a file.
+        Get the prompt base for a chatbot.
         """
 
-        prompt_string = ""
+        return self.get_model_profile(chatbot).template.template
 
-        match chatbot.name.lower():
-            case "gpt4all":
-                prompt_string = resources.read_text("bot_aukerman.prompts",
-                                                    "gpt4all.txt")
-            case "rwkv":
-                prompt_string = resources.read_text("bot_aukerman.prompts",
-                                                    "rwkv-raven.txt")
-            case "gpt2":
-                prompt_string = resources.read_text("bot_aukerman.prompts",
-                                                    "gpt2.txt")
-            case _:
-                prompt_string = resources.read_text("bot_aukerman.prompts",
-                                                    "minimal-predict.txt")
+    def get_parser_flags(self, chatbot: AutoChatbot) -> List[str]:
+        """
+        Get the Interpreter flags to parse a chatbot's responses with.
+        """
 
-        return prompt_string
+        return self.get_model_profile(chatbot).parser_flags
 
     # Parse chatbot response and return dialogue string
     def parse_response(self,
@@ -596,17 +1033,7 @@ class Generator():
         """
 
         # Parser flags
-        flags = []
-
-        # Set flags based on chatbot
-        match chatbot.name.lower():
-            case "gpt2":
-                flags.append("ignore_first_char_newline")
-                # flags.append("discard_multiple_char_names") #@REVISIT not in use
-
-            case _:
-                if __debug__ and self.verbose:
-                    warn("No flags set for chatbot", chatbot.name)
+        flags = self.get_parser_flags(chatbot)
 
         # Strip leading and trailing whitespace
         #@REVISIT always?
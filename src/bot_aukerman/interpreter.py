@@ -1,6 +1,6 @@
-from typing import List
+from typing import Iterable, Iterator, List, Optional, Tuple
 from .script_component import ScriptComponent
-from .scene_header import SceneHeader
+from .scene_header import SceneHeader, LOCATION_PREFIX_REGEX
 from .dialogue import Dialogue
 from .scene_action import SceneAction
 from .logging import warn
@@ -10,6 +10,12 @@ class Interpreter:
     context: str = "none"
     working_component: dict = {}
 
+    # Streaming state (see feed() and close())
+    flags: list = []
+    line_buffer: str = ""
+    previous_line: Optional[str] = None
+    stream_started: bool = False
+
     verbose: bool = True
 
     #@REVISIT architecture between this and parse_text
@@ -42,6 +48,29 @@ class Interpreter:
 
         return script_components
 
+    @classmethod
+    def interpret_lines(cls,
+                        lines: Iterable[str],
+                        flags = []
+                        ) -> Iterator[ScriptComponent]:
+        """
+        Interpret lines (without newlines) as a script, yielding components
+        as they are closed.
+        """
+        interpreter = cls()
+
+        return interpreter.iter_lines(lines, flags = flags)
+
+    @classmethod
+    def start_stream(cls, flags = []) -> "Interpreter":
+        """
+        Create an interpreter to be fed streamed text with feed().
+        """
+        interpreter = cls()
+        interpreter.reset_state(flags = flags)
+
+        return interpreter
+
     #@REVISIT architecture between this and interpret
     def parse_text(self, text: str, flags = []) -> List[ScriptComponent]:
         """
@@ -53,7 +82,7 @@ class Interpreter:
             raise ValueError("text is None")
 
         # Reset interpreter state
-        self.reset_state()
+        self.reset_state(flags = flags)
 
         if "ignore_first_char_newline" in flags:
             # If first character of response is a newline, remove it
@@ -77,103 +106,195 @@ class Interpreter:
 
         return script_components
 
-    def reset_state(self):
+    def iter_lines(self,
+                   lines: Iterable[str],
+                   flags = []
+                   ) -> Iterator[ScriptComponent]:
+        """
+        Parse lines lazily, yielding script components as they are closed.
+
+        Gives the same components as parse_text() on the joined lines, without
+        holding the text or the component list in memory.
+        """
+
+        # Reset interpreter state
+        self.reset_state(flags = flags)
+
+        first_line = True
+        for line in lines:
+            if first_line:
+                first_line = False
+
+                if "ignore_first_char_newline" in flags:
+                    # If text starts with a newline, skip the empty first line
+                    if(len(line) == 0):
+                        continue
+
+            component = self.parse_line(line)
+            if component is not None:
+                yield component
+
+        component = self.close_working_component()
+        if component is not None:
+            yield component
+
+    def reset_state(self, flags = []):
         self.context = "none"
         self.working_component = {}
 
+        # Streaming state
+        self.flags = flags
+        self.line_buffer = ""
+        self.previous_line = None
+        self.stream_started = False
+
     def parse_lines(self,
                     lines,
                     ) -> List[ScriptComponent]:
         components = []
 
-        for line_index, line in enumerate(lines):
-            line = line.strip()
+        for line in lines:
+            component = self.parse_line(line)
+            if component is not None:
+                components.append(component)
 
-            if __debug__ and self.verbose:
-                print("context:", self.context, " | line:", line)
+        component = self.close_working_component()
+        if component is not None:
+            components.append(component)
 
-            match self.context:
-                case "none":
-                    # If line is empty
-                    if(len(line) == 0):
-                        continue
+        return components
 
-                    # Attempt to parse as scene header
-                    try:
-                        component = SceneHeader.from_str(line)
-                        components.append(component)
-                        continue
-                    except ValueError as e:
-                        warn(f"{e}")
+    def feed(self, chunk: str) -> List[ScriptComponent]:
+        """
+        Feed a chunk of streamed text (e.g. tokens from a chatbot) to the
+        interpreter and return any script components it closed.
 
-                    # Attempt to parse as single line dialogue
-                    try:
-                        component = self.parse_single_line_dialogue(line)
-                        components.append(component)
-                        continue
-                    except ValueError as e:
-                        warn(f"{e}")
+        Use start_stream() to create a streaming interpreter, and call close()
+        after the last chunk.
+        """
 
-                    try:
-                        component = SceneAction.from_str(line)
-                        components.append(component)
-                        continue
-                    except ValueError as e:
-                        warn(f"{e}")
+        components = []
 
-                    # Attempt to parse as character name
-                    # If all uppercase #@TODO hacky solution  
-                    if(line.isupper()):
-                        # Assume character name
-                        self.working_component["character_name"] = line
+        if not chunk:
+            return components
 
-                        # Await dialogue
-                        self.context = "dialogue"
-                    else:
-                        #@TODO check if in character list; etc.
-                        pass
+        # Apply first-chunk flags
+        if not self.stream_started:
+            self.stream_started = True
 
-                case "dialogue" | "dialogue_continued":
-                    # If line is empty
-                    if(len(line) == 0):
-                        # If expecting initial dialogue (none encountered yet)
-                        if(self.context == "dialogue"):
-                            # If last line was also blank
-                            if(line_index > 0 and len(lines[line_index - 1]) == 0):
-                                # Reset context after two blank lines
-                                self.context = "none"
-
-                        # If expecting more dialogue (some already supplied)
-                        elif(self.context == "dialogue_continued"):
-                            #@REVISIT
-                            # Create component from working component dict
-                            component = self.close_working_component()
-                            components.append(component)
-                            self.context = "none"
+            if "ignore_first_char_newline" in self.flags:
+                # If first character of response is a newline, remove it
+                if(chunk[0] == "\n"):
+                    chunk = chunk[1:]
 
-                    # If line is not empty
-                    else:
-                        # If line is all uppercase
-                        if(line.isupper()):
-                            if __debug__ and self.verbose:
-                                warn(f"dialogue is all uppercase: {line}")
+        # If chunk doesn't complete a line, just buffer it
+        if "\n" not in chunk:
+            self.line_buffer += chunk
+            return components
 
-                        # Add line to dialogue
-                        if(self.context == "dialogue"):
-                            self.working_component["dialogue"] = line
-                            self.context = "dialogue_continued"
-                        else:
-                            self.working_component["dialogue"] += "\n" + line
+        # Parse completed lines; keep trailing partial line buffered
+        lines = (self.line_buffer + chunk).split("\n")
+        self.line_buffer = lines.pop()
 
-                case _:
-                    raise ValueError("invalid context: " + self.context)
+        for line in lines:
+            component = self.parse_line(line)
+            if component is not None:
+                components.append(component)
 
-        component = self.close_working_component()
-        if component is not None:
-            components.append(component)
+        return components
+
+    def close(self) -> List[ScriptComponent]:
+        """
+        Finish a stream started with feed() and return any remaining script
+        components.
+
+        The interpreter is left ready for a new stream, so closing it again
+        returns nothing.
+        """
+
+        # Parse the last (unterminated) line
+        lines = [self.line_buffer]
+        self.line_buffer = ""
+
+        components = self.parse_lines(lines)
+
+        # Don't emit the closed component again on a second close()
+        self.reset_state(flags = self.flags)
 
         return components
 
+    def parse_line(self, line: str) -> Optional[ScriptComponent]:
+        """
+        Advance the interpreter by a single line and return the script
+        component closed by it, if any.
+        """
+
+        component = None
+
+        previous_line = self.previous_line
+        self.previous_line = line
+
+        line = line.strip()
+
+        if __debug__ and self.verbose:
+            print("context:", self.context, " | line:", line)
+
+        match self.context:
+            case "none":
+                # If line is empty
+                if(len(line) == 0):
+                    return None
+
+                # Determine line type in a single pass
+                line_type, component = self.classify_line(line)
+
+                if component is not None:
+                    return component
+
+                # Assume character name
+                #@TODO check if in character list; etc.
+                if line_type == "character_name":
+                    self.working_component["character_name"] = line
+
+                    # Await dialogue
+                    self.context = "dialogue"
+
+            case "dialogue" | "dialogue_continued":
+                # If line is empty
+                if(len(line) == 0):
+                    # If expecting initial dialogue (none encountered yet)
+                    if(self.context == "dialogue"):
+                        # If last line was also blank
+                        if(previous_line is not None and len(previous_line) == 0):
+                            # Reset context after two blank lines
+                            self.context = "none"
+
+                    # If expecting more dialogue (some already supplied)
+                    elif(self.context == "dialogue_continued"):
+                        #@REVISIT
+                        # Create component from working component dict
+                        component = self.close_working_component()
+                        self.context = "none"
+
+                # If line is not empty
+                else:
+                    # If line is all uppercase
+                    if(line.isupper()):
+                        if __debug__ and self.verbose:
+                            warn(f"dialogue is all uppercase: {line}")
+
+                    # Add line to dialogue
+                    if(self.context == "dialogue"):
+                        self.working_component["dialogue"] = line
+                        self.context = "dialogue_continued"
+                    else:
+                        self.working_component["dialogue"] += "\n" + line
+
+            case _:
+                raise ValueError("invalid context: " + self.context)
+
+        return component
+
     def close_working_component(self):
         match self.context:
             case "dialogue" | "dialogue_continued":
@@ -193,36 +314,84 @@ class Interpreter:
 
                 return None
 
+    def classify_line(self,
+                      line: str
+                      ) -> Tuple[str, Optional[ScriptComponent]]:
+        """
+        Classify a stripped, non-empty line outside of any component.
+
+        Returns a tuple of the line type ("scene_header", "dialogue",
+        "scene_action" or "character_name") and the component parsed from the
+        line, if the line forms a complete component on its own.
+        """
+
+        # Scene header
+        location_prefix_match = LOCATION_PREFIX_REGEX.search(line)
+        if location_prefix_match:
+            return ("scene_header",
+                    SceneHeader.from_prefix_match(line, location_prefix_match))
+
+        # Single line dialogue
+        dialogue = self.match_single_line_dialogue(line)
+        if dialogue is not None:
+            return ("dialogue", dialogue)
+
+        # Scene action
+        #@REVISIT might want a more complex check; can action ever be all caps?
+        if not line.isupper():
+            return ("scene_action", SceneAction(line))
+
+        # Character name (all uppercase) #@TODO hacky solution
+        return ("character_name", None)
+
     #@REVISIT not currently in use
     def parse_single_line_dialogue(self, text: str):
+        dialogue = self.match_single_line_dialogue(text)
+
+        if dialogue is None:
+            # If there is no colon
+            if ":" not in text:
+                #@TODO attempt to parse anyway
+                raise ValueError("no colon found in dialogue_line_str: " \
+                                 + text)
+
+            # If there is no dialogue
+            raise ValueError(f"no dialogue found in dialogue_line_str: {text}")
+
+        return dialogue
+
+    def match_single_line_dialogue(self, text: str) -> Optional[Dialogue]:
+        """
+        Parse a line of the form "NAME: dialogue"; return None if the line is
+        not single line dialogue.
+        """
+
         # Split on colon
-        colon_split = text.split(":", 1)
+        name_part, colon, dialogue = text.partition(":")
 
         # If there is no colon
-        if(len(colon_split) == 1):
-            #@TODO attempt to parse anyway
-            raise ValueError("no colon found in dialogue_line_str: " \
-                             + text)
+        if not colon:
+            return None
 
         parenthetical = ""
 
         # Check for parenthetical before colon
         #@REVISIT should we try to handle more than one?
-        if("(" in colon_split[0] and ")" in colon_split[0]):
-            character_name = colon_split[0].split("(")[0].strip()
-            parenthetical = colon_split[0].split("(")[1].split(")")[0].strip()
-        elif("[" in colon_split[0] and "]" in colon_split[0]):
-            character_name = colon_split[0].split("[")[0].strip()
-            parenthetical = colon_split[0].split("[")[1].split("]")[0].strip()
+        if("(" in name_part and ")" in name_part):
+            character_name = name_part.split("(")[0].strip()
+            parenthetical = name_part.split("(")[1].split(")")[0].strip()
+        elif("[" in name_part and "]" in name_part):
+            character_name = name_part.split("[")[0].strip()
+            parenthetical = name_part.split("[")[1].split("]")[0].strip()
 
         # If no parenthetical
         else:
-            character_name = colon_split[0]
+            character_name = name_part
 
         # Convert character_name to uppercase
         character_name = character_name.upper().strip()
 
-        dialogue = colon_split[1].strip()
+        dialogue = dialogue.strip()
 
         # If paren in character name, prepend to dialogue
         if parenthetical:
@@ -230,7 +399,7 @@ class Interpreter:
 
         # If there is no dialogue
         if(len(dialogue) == 0):
-            raise ValueError(f"no dialogue found in dialogue_line_str: {text}")
+            return None
 
         return Dialogue(character_name, dialogue)
 
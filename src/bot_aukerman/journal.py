@@ -0,0 +1,225 @@
+"""
+Buffered, append-only writer for a performance's dialogue history file.
+"""
+
+import os
+import time
+import atexit
+import weakref
+import threading
+from typing import Optional, TextIO
+
+# Journals with an open file, flushed when the interpreter exits
+open_journals: "weakref.WeakSet[ScriptJournal]" = weakref.WeakSet()
+
+class ScriptJournal:
+    """
+    Keeps the history file open and buffers writes to it.
+
+    flush_policy decides when buffered writes reach the file:
+    - "component": after every component
+    - "turn": when end_turn() is called (e.g. after each generate_dialogue())
+    - "interval": at most flush_interval seconds after a write (from a timer
+      thread if nothing else flushes first)
+
+    If fsync is set, every flush is also synced to disk. flush() and close()
+    always write everything out.
+    """
+
+    path: str
+    flush_policy: str = "component"
+    flush_interval: float = 1.0
+    fsync: bool = False
+
+    file: Optional[TextIO] = None
+    has_unflushed_writes: bool = False
+
+    # Size of the history file in bytes, including buffered writes; None
+    # until known
+    size: Optional[int] = None
+    last_flush_time: float = 0.0
+
+    # Pending flush under the "interval" policy
+    flush_timer: Optional[threading.Timer] = None
+
+    def __init__(self,
+                 path: str,
+                 flush_policy: str = "component",
+                 flush_interval: float = 1.0,
+                 fsync: bool = False):
+        if flush_policy not in ("component", "turn", "interval"):
+            raise ValueError(f"Unknown journal flush policy: {flush_policy}")
+
+        self.path = path
+        self.flush_policy = flush_policy
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.last_flush_time = time.monotonic()
+
+        # Held while using the file, which the flush timer also does
+        self.lock = threading.RLock()
+
+    def open(self):
+        """
+        Open the history file for appending, if not already open.
+        """
+
+        if self.file is None:
+            self.file = open(self.path, mode = "a", encoding = "utf-8")
+            self.size = os.path.getsize(self.path)
+            open_journals.add(self)
+
+    def write(self, text: str):
+        """
+        Append text (a rendered component) to the history file.
+        """
+
+        with self.lock:
+            self.open()
+            assert self.file
+
+            self.file.write(text)
+            self.has_unflushed_writes = True
+
+            assert self.size is not None
+            self.size += len(text.encode("utf-8"))
+
+            if self.flush_policy == "component":
+                self.flush()
+            elif self.flush_policy == "interval":
+                self.flush_if_due()
+
+                # Flush when the interval expires, even if nothing else is
+                # written
+                if self.has_unflushed_writes and self.flush_timer is None:
+                    self.start_flush_timer()
+
+    def end_turn(self):
+        """
+        Mark the end of a turn; flushes under the "turn" and "interval"
+        policies.
+        """
+
+        if self.flush_policy == "turn":
+            self.flush()
+        elif self.flush_policy == "interval":
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        if time.monotonic() - self.last_flush_time >= self.flush_interval:
+            self.flush()
+
+    def start_flush_timer(self):
+        delay = self.flush_interval - (time.monotonic() - self.last_flush_time)
+
+        self.flush_timer = threading.Timer(max(0.0, delay), self.flush_on_timer)
+        self.flush_timer.daemon = True
+        self.flush_timer.start()
+
+    def flush_on_timer(self):
+        with self.lock:
+            self.flush_timer = None
+            self.flush()
+
+    def cancel_flush_timer(self):
+        if self.flush_timer is not None:
+            self.flush_timer.cancel()
+            self.flush_timer = None
+
+    def flush(self):
+        """
+        Write buffered text out to the history file.
+        """
+
+        with self.lock:
+            if self.file is None or not self.has_unflushed_writes:
+                return
+
+            self.file.flush()
+
+            if self.fsync:
+                os.fsync(self.file.fileno())
+
+            self.has_unflushed_writes = False
+            self.last_flush_time = time.monotonic()
+
+    def get_size(self) -> int:
+        """
+        Flush and return the size of the history file in bytes.
+        """
+
+        self.flush()
+
+        return self.get_offset()
+
+    def get_offset(self) -> int:
+        """
+        Return the byte offset the next write will start at.
+        """
+
+        if self.size is None:
+            if not os.path.isfile(self.path):
+                return 0
+
+            self.size = os.path.getsize(self.path)
+
+        return self.size
+
+    def truncate(self, size: int):
+        """
+        Cut the history file down to its first size bytes.
+        """
+
+        with self.lock:
+            self.close()
+
+            os.truncate(self.path, size)
+            self.size = size
+
+    def rotate(self, new_path: str):
+        """
+        Move the history file to new_path; writing again starts a new file.
+        """
+
+        with self.lock:
+            self.close()
+
+            os.rename(self.path, new_path)
+            self.size = None
+
+    def rewrite(self, text: str):
+        """
+        Replace the contents of the history file with text.
+        """
+
+        with self.lock:
+            self.close()
+
+            # Write to temporary file first so a crash can't lose the history
+            temp_path = self.path + ".tmp"
+            with open(temp_path, mode = "w", encoding = "utf-8") as f:
+                f.write(text)
+
+            os.replace(temp_path, self.path)
+            self.size = len(text.encode("utf-8"))
+
+    def close(self):
+        """
+        Flush and close the history file. Writing again reopens it.
+        """
+
+        with self.lock:
+            self.cancel_flush_timer()
+
+            if self.file is None:
+                return
+
+            self.flush()
+            self.file.close()
+            self.file = None
+            open_journals.discard(self)
+
+@atexit.register
+def flush_open_journals():
+    for journal in list(open_journals):
+        journal.close()
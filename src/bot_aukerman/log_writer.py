@@ -0,0 +1,231 @@
+"""
+Background writer for a performance's log file.
+
+Log messages (prompts and responses) are put on a bounded queue and written
+out in batches by a writer thread, so logging costs a queue put on the
+generation path.
+"""
+
+import os
+import queue
+import atexit
+import weakref
+import threading
+from typing import Optional, TextIO
+
+# Writers with a running thread, closed when the interpreter exits
+open_log_writers: "weakref.WeakSet[LogWriter]" = weakref.WeakSet()
+
+# Queued to tell the writer thread to finish
+STOP = object()
+
+class LogWriter:
+    """
+    Appends messages to a log file from a background thread.
+
+    When the queue is full, messages are dropped (full_policy "drop", counted
+    in dropped_messages) or the caller waits for room ("block"). The file is
+    rotated to path.1, path.2, … once it reaches max_bytes; max_bytes of 0
+    disables rotation. If the writer thread has died (e.g. on a write error),
+    messages are written synchronously instead.
+    """
+
+    path: str
+    full_policy: str = "drop"
+    max_bytes: int = 0
+    backup_count: int = 3
+
+    # Maximum number of messages written in one batch
+    batch_size: int = 256
+
+    # Seconds between checks that the writer thread is alive while waiting
+    # for room in the queue
+    put_timeout: float = 0.5
+
+    dropped_messages: int = 0
+
+    thread: Optional[threading.Thread] = None
+    file: Optional[TextIO] = None
+    file_size: int = 0
+
+    def __init__(self,
+                 path: str,
+                 max_queue_size: int = 1024,
+                 full_policy: str = "drop",
+                 max_bytes: int = 0,
+                 backup_count: int = 3):
+        if full_policy not in ("drop", "block"):
+            raise ValueError(f"Unknown log queue full policy: {full_policy}")
+
+        self.path = path
+        self.full_policy = full_policy
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.queue = queue.Queue(maxsize = max_queue_size)
+        self.lock = threading.Lock()
+
+    def write(self, message: str):
+        """
+        Queue a message to be appended to the log file.
+        """
+
+        self.start()
+
+        if not self.is_writer_alive():
+            self.write_synchronously([message])
+            return
+
+        if self.full_policy == "block":
+            if not self.put_while_alive(message):
+                self.write_synchronously([message])
+            return
+
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.dropped_messages += 1
+
+    def is_writer_alive(self) -> bool:
+        thread = self.thread
+        return thread is not None and thread.is_alive()
+
+    def put_while_alive(self, item, thread = None) -> bool:
+        """
+        Put item on the queue, waiting for room as long as the writer thread
+        is alive; returns whether it was queued.
+        """
+
+        thread = thread or self.thread
+
+        while thread is not None and thread.is_alive():
+            try:
+                self.queue.put(item, timeout = self.put_timeout)
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+    def write_synchronously(self, messages: list):
+        """
+        Append messages (and anything left on the queue) to the log file on
+        the calling thread.
+        """
+
+        while True:
+            try:
+                message = self.queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if message is not STOP:
+                messages.append(message)
+
+        with self.lock:
+            with open(self.path, mode = "a", encoding = "utf-8") as f:
+                f.write("".join(messages))
+
+    def start(self):
+        """
+        Start the writer thread, if not already running.
+        """
+
+        if self.thread is not None:
+            return
+
+        with self.lock:
+            if self.thread is not None:
+                return
+
+            self.thread = threading.Thread(target = self.run,
+                                           name = "bot-aukerman-log-writer",
+                                           daemon = True)
+            self.thread.start()
+            open_log_writers.add(self)
+
+    def run(self):
+        self.open_file()
+
+        stopping = False
+        while not stopping:
+            # Wait for a message, then take whatever else is queued
+            messages = [self.queue.get()]
+            while len(messages) < self.batch_size:
+                try:
+                    messages.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if STOP in messages:
+                stopping = True
+                messages = [m for m in messages if m is not STOP]
+
+            self.write_batch(messages)
+
+        assert self.file
+        self.file.close()
+        self.file = None
+
+    def open_file(self):
+        self.file = open(self.path, mode = "a", encoding = "utf-8")
+        self.file_size = self.file.tell()
+
+    def write_batch(self, messages: list):
+        if not messages:
+            return
+
+        assert self.file
+
+        text = "".join(messages)
+        self.file.write(text)
+        self.file.flush()
+        self.file_size += len(text.encode("utf-8"))
+
+        if self.max_bytes and self.file_size >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        """
+        Move the log file to path.1 (shifting older backups) and start a new
+        one.
+        """
+
+        assert self.file
+        self.file.close()
+
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f"{self.path}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{index + 1}")
+
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+        self.open_file()
+
+    def close(self, timeout: Optional[float] = None):
+        """
+        Write out queued messages and stop the writer thread.
+        """
+
+        with self.lock:
+            thread = self.thread
+            self.thread = None
+
+        if thread is None:
+            return
+
+        if self.put_while_alive(STOP, thread):
+            thread.join(timeout)
+        else:
+            # Writer thread died; write out what it left queued
+            self.write_synchronously([])
+
+        open_log_writers.discard(self)
+
+@atexit.register
+def close_open_log_writers():
+    for log_writer in list(open_log_writers):
+        log_writer.close()
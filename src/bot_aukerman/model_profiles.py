@@ -0,0 +1,160 @@
+"""
+Per-model generation profiles.
+
+A ModelProfile bundles everything the Generator needs to know about a kind of
+chatbot: its prompt template (parsed once), the Interpreter flags to parse its
+responses with and its stop sequences. Profiles are built on first use and
+reused for the life of the process.
+"""
+
+import re
+from importlib import resources
+from typing import List, Optional
+
+from .logging import warn
+
+# Matches a prompt template placeholder, and the blank line before it if any
+PLACEHOLDER_REGEX = re.compile(r"(\n\n)?\{\{\w+\}\}")
+
+class PromptTemplate:
+    """
+    A prompt template split into literal text and placeholders.
+    """
+
+    template: str
+
+    # Alternating literal text and placeholders; placeholders at odd indices
+    segments: List[str]
+
+    # (start, end) offsets of each placeholder in template
+    placeholder_offsets: List[tuple]
+
+    def __init__(self, template: str):
+        self.template = template
+        self.segments = []
+        self.placeholder_offsets = []
+
+        position = 0
+        for match in PLACEHOLDER_REGEX.finditer(template):
+            self.segments.append(template[position:match.start()])
+            self.segments.append(match.group(0))
+            self.placeholder_offsets.append(match.span())
+            position = match.end()
+
+        self.segments.append(template[position:])
+
+    def render(self, replacements: dict) -> str:
+        """
+        Fill in the template's placeholders.
+
+        Keys of replacements are placeholders such as "{{working_script}}"; a
+        key may include the blank line before the placeholder (e.g.
+        "\n\n{{extra_directions}}") to replace that too. Unknown placeholders
+        are left as they are.
+        """
+
+        rendered_segments = self.segments.copy()
+
+        for index in range(1, len(rendered_segments), 2):
+            placeholder = rendered_segments[index]
+
+            if placeholder in replacements:
+                rendered_segments[index] = replacements[placeholder]
+
+            # Placeholder matched with a preceding blank line it doesn't own
+            elif placeholder.startswith("\n\n") \
+                    and placeholder[2:] in replacements:
+                rendered_segments[index] = "\n\n" + replacements[placeholder[2:]]
+
+        return "".join(rendered_segments)
+
+class ModelProfile:
+    name: str
+    template: PromptTemplate
+
+    # Interpreter flags for parsing responses
+    parser_flags: List[str]
+
+    def __init__(self,
+                 name: str,
+                 template: PromptTemplate,
+                 parser_flags: List[str] = []):
+        self.name = name
+        self.template = template
+        self.parser_flags = parser_flags
+
+    #@SCAFFOLDING
+    def get_stop_sequences(self, is_remote: bool, num_lines: int = 1) -> list:
+        """
+        Get the stop sequences to request num_lines of dialogue with.
+        """
+
+        stop_sequences = []
+
+        if num_lines == 1:
+            # If chatbot is remote
+            if is_remote:
+                # Assume regex not supported, just stop gen on double newline
+                #@REVISIT!
+                stop_sequences.append("\n\n")
+
+            # If chatbot is local
+            else:
+                # Stop gen on double newline after non-whitespace character
+                stop_sequences.append({
+                    "type": "regex",
+                    "value": r"[\S]+\n\n"
+                })
+
+        return stop_sequences
+
+# Profile settings by lowercase chatbot name; None for chatbots without one
+MODEL_PROFILE_SETTINGS = {
+    "gpt4all": {
+        "prompt_file": "gpt4all.txt",
+    },
+    "rwkv": {
+        "prompt_file": "rwkv-raven.txt",
+    },
+    "gpt2": {
+        "prompt_file": "gpt2.txt",
+        "parser_flags": ["ignore_first_char_newline"],
+        # "discard_multiple_char_names" #@REVISIT not in use
+    },
+    None: {
+        "prompt_file": "minimal-predict.txt",
+    },
+}
+
+# Profiles built so far, by lowercase chatbot name
+model_profiles: dict = {}
+
+def get_model_profile(chatbot_name: str) -> ModelProfile:
+    """
+    Get the profile for a chatbot, building it on first use.
+    """
+
+    name = chatbot_name.lower()
+
+    profile = model_profiles.get(name)
+    if profile:
+        return profile
+
+    settings: Optional[dict] = MODEL_PROFILE_SETTINGS.get(name)
+    if settings is None:
+        settings = MODEL_PROFILE_SETTINGS[None]
+
+    if "parser_flags" not in settings:
+        if __debug__:
+            warn("No flags set for chatbot", chatbot_name)
+
+    prompt_string = resources.read_text("bot_aukerman.prompts",
+                                        settings["prompt_file"])
+
+    profile = ModelProfile(name = name,
+                           template = PromptTemplate(prompt_string),
+                           parser_flags = settings.get("parser_flags", []))
+
+    model_profiles[name] = profile
+
+    return profile
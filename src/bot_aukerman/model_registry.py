@@ -0,0 +1,326 @@
+"""
+Process-wide registry of loaded chatbot models.
+
+Loading a model is expensive, so performers (and performances) with the same
+model_config share a single AutoChatbot engine. Each user of an engine gets
+its own ChatbotView, which behaves like an AutoChatbot with a private context;
+the engine's context is swapped whenever a different view uses it.
+"""
+
+import json
+import threading
+from llmber import AutoChatbot
+
+# Engine methods that generate a response (and may add it to the context)
+RESPONSE_METHODS = ("request_string", "request_tokens")
+
+# model_config keys that configure a view rather than the engine, so views
+# differing only in these share an engine
+VIEW_OPTIONS = ("keep_response_in_context",)
+
+class ModelEntry:
+    """
+    A loaded chatbot engine and the bookkeeping needed to share it.
+    """
+
+    key: str
+    model_config: dict
+    chatbot: AutoChatbot
+
+    # Number of views handed out for this engine
+    refcount: int = 0
+
+    # View whose context is currently loaded into the engine
+    active_view = None
+
+    # Number of calls currently running on the engine for active_view
+    in_flight: int = 0
+
+    def __init__(self, key: str, model_config: dict, chatbot: AutoChatbot):
+        self.key = key
+        self.model_config = model_config
+        self.chatbot = chatbot
+        self.condition = threading.Condition()
+
+class ChatbotView:
+    """
+    A handle on a shared chatbot engine with its own context.
+
+    Attributes and methods are forwarded to the engine. Method calls first
+    load this view's context into the engine (saving the previous view's
+    context), and wait for calls made through other views to finish; calls
+    through the same view may run concurrently.
+    """
+
+    entry: ModelEntry
+
+    # Saved context; None while empty or while loaded into the engine
+    context = None
+
+    # Whether responses are left in the context; if not, the context from
+    # before each request is put back once the response has been received
+    keep_response_in_context: bool = True
+
+    def __init__(self, entry: ModelEntry):
+        self.entry = entry
+
+    def __getattr__(self, name):
+        attribute = getattr(self.entry.chatbot, name)
+
+        if not callable(attribute):
+            return attribute
+
+        def call_in_context(*args, **kwargs):
+            return self.call(attribute, *args, **kwargs)
+
+        return call_in_context
+
+    def call(self, method, *args, **kwargs):
+        """
+        Call an engine method with this view's context loaded.
+        """
+
+        self.activate()
+
+        # Context to put back once the response has been received
+        context = None
+        if not self.keep_response_in_context \
+                and getattr(method, "__name__", None) in RESPONSE_METHODS:
+            context = self.entry.chatbot.get_context()
+
+        try:
+            result = method(*args, **kwargs)
+        except BaseException:
+            self.deactivate(context)
+            raise
+
+        # Keep context loaded while a streamed response is consumed
+        if hasattr(result, "__next__"):
+            return ContextHoldingIterator(self, result, context)
+
+        self.deactivate(context)
+
+        return result
+
+    def activate(self):
+        """
+        Load this view's context into the engine and mark a call in flight.
+        """
+
+        entry = self.entry
+        chatbot = entry.chatbot
+
+        with entry.condition:
+            # Wait for calls through other views to finish
+            while entry.active_view is not self and entry.in_flight:
+                entry.condition.wait()
+
+            # Swap contexts if another view was using the engine
+            if entry.active_view is not self:
+                if entry.active_view is not None:
+                    entry.active_view.context = chatbot.get_context()
+
+                if self.context is None:
+                    chatbot.clear_context()
+                else:
+                    chatbot.set_context(self.context)
+                    self.context = None
+
+                entry.active_view = self
+
+            entry.in_flight += 1
+
+    def get_view_context(self):
+        """
+        Get this view's context (None if empty) without loading it.
+        """
+
+        entry = self.entry
+
+        with entry.condition:
+            while entry.active_view is self and entry.in_flight:
+                entry.condition.wait()
+
+            if entry.active_view is self:
+                return entry.chatbot.get_context()
+
+            return self.context
+
+    def set_view_context(self, context):
+        """
+        Replace this view's context (None to empty it) without loading it.
+        """
+
+        entry = self.entry
+
+        with entry.condition:
+            while entry.active_view is self and entry.in_flight:
+                entry.condition.wait()
+
+            if entry.active_view is self:
+                # Let the next activation load the new context
+                entry.active_view = None
+
+            self.context = context
+
+    def deactivate(self, context = None):
+        """
+        Mark a call through this view as finished, first putting back context
+        if it isn't None.
+        """
+
+        entry = self.entry
+
+        with entry.condition:
+            if context is not None:
+                entry.chatbot.set_context(context)
+
+            entry.in_flight -= 1
+            entry.condition.notify_all()
+
+class ContextHoldingIterator:
+    """
+    Wraps an iterator returned by an engine call so that the view stays
+    active until the iterator is exhausted, closed or garbage collected.
+    """
+
+    def __init__(self, view: ChatbotView, iterator, context = None):
+        self.view = view
+        self.iterator = iterator
+        self.active = True
+
+        # Context to put back when done; see ChatbotView.call()
+        self.context = context
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.iterator)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if not self.active:
+            return
+
+        self.active = False
+
+        try:
+            if hasattr(self.iterator, "close"):
+                self.iterator.close()
+        finally:
+            self.view.deactivate(self.context)
+
+    def __del__(self):
+        # Don't block other views forever if abandoned without close()
+        self.close()
+
+class ModelRegistry:
+    """
+    Hands out shared, refcounted chatbot engines keyed by model_config.
+    """
+
+    def __init__(self):
+        self.entries: dict[str, ModelEntry] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def normalize_config(model_config: dict) -> str:
+        """
+        Return a key identifying model_config regardless of key order.
+        """
+
+        return json.dumps(model_config, sort_keys = True, default = str)
+
+    def acquire(self, model_config: dict, slot: int = 0) -> ChatbotView:
+        """
+        Get a view on the chatbot for model_config, loading it if necessary.
+
+        Each slot other than 0 is a separate instance of the engine, for
+        callers that need requests to run in parallel (e.g. remote candidate
+        generations). VIEW_OPTIONS in model_config apply to the view only.
+        """
+
+        view_options = {
+            option: model_config[option]
+            for option in VIEW_OPTIONS if option in model_config
+        }
+        model_config = {
+            option: value for option, value in model_config.items()
+            if option not in VIEW_OPTIONS
+        }
+
+        key = self.normalize_config(model_config)
+        if slot:
+            key += f"#{slot}"
+
+        #@REVISIT loading under the lock blocks acquiring other models
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None:
+                entry = ModelEntry(key,
+                                   model_config,
+                                   AutoChatbot(model_config = model_config))
+                self.entries[key] = entry
+
+            entry.refcount += 1
+
+        view = ChatbotView(entry)
+
+        if "keep_response_in_context" in view_options:
+            view.keep_response_in_context = \
+                    view_options["keep_response_in_context"]
+
+        return view
+
+    def share(self, view: ChatbotView) -> ChatbotView:
+        """
+        Get another view on view's chatbot, starting from view's current
+        context.
+        """
+
+        entry = view.entry
+
+        with self.lock:
+            entry.refcount += 1
+
+        shared_view = ChatbotView(entry)
+        shared_view.context = view.get_view_context()
+        shared_view.keep_response_in_context = view.keep_response_in_context
+
+        return shared_view
+
+    def release(self, view: ChatbotView):
+        """
+        Release a view; unload its chatbot if no views remain.
+        """
+
+        entry = view.entry
+
+        with self.lock:
+            entry.refcount -= 1
+
+            if entry.refcount > 0:
+                return
+
+            # Drop entry so the model can be garbage collected
+            if self.entries.get(entry.key) is entry:
+                del self.entries[entry.key]
+
+        unload = getattr(entry.chatbot, "unload", None)
+        if callable(unload):
+            unload()
+
+    def get_model_count(self) -> int:
+        """
+        Return the number of distinct models currently loaded.
+        """
+
+        return len(self.entries)
+
+# Registry shared by every Performance in the process
+model_registry = ModelRegistry()
@@ -1,8 +1,11 @@
 import os
+import copy
 import datetime
 import appdirs
 import time
-from typing import Optional, List, NewType
+import threading
+from array import array
+from typing import Optional, List, NewType, Callable, Iterable
 # from threading import Thread
 # import multiprocessing
 
@@ -23,7 +26,15 @@ from .interpreter import Interpreter
 from .constants import ScriptFormat, ScriptComponentType
 from .logging import warn
 
-from llmber import AutoChatbot
+from .model_registry import model_registry, ChatbotView
+from .context_cache import ContextCache
+from .context_window import ContextWindow, approximate_token_count
+from .validation import ValidationPipeline
+from .journal import ScriptJournal
+from .log_writer import LogWriter
+from .script_file import iter_script_file
+from .working_script import WorkingScript, SharedPrefixList
+from .snapshot import ScriptSnapshot, SnapshotWriter, read_snapshot
 
 #@TODO Optional[CoquiImp] and Optional[VoskImp] are not working as expected
 # when using try/except to import the modules. Bored of trying to debug it.
@@ -50,7 +61,7 @@ class Performance:
     """
 
     # Script / dialogue history
-    working_script: List[ScriptComponent] = []
+    working_script: WorkingScript
 
     # Format of script
     script_format: ScriptFormat = ScriptFormat.FOUNTAIN
@@ -58,16 +69,106 @@ class Performance:
     # Number of lines to generate during generate_dialogue()
     num_lines: int = 0
 
+    # Number of candidate generations to request from remote chatbots, and
+    # how many of them may be in flight at once; the first valid candidate is
+    # kept and candidates not yet started are never requested
+    num_candidates: int = 1
+    max_concurrent_candidates: int = 2
+
     # Where to save the script
     logdir: str
 
+    # Writer for current-dialogue-history.txt
+    journal: ScriptJournal
+
+    # When journal writes reach the file ("component", "turn" or "interval";
+    # see ScriptJournal), the interval in seconds and whether to fsync
+    journal_flush_policy: str = "component"
+    journal_flush_interval: float = 1.0
+    journal_fsync: bool = False
+
+    # Write a binary snapshot of the script alongside the history file every
+    # snapshot_interval components (0 to disable); see resume_script_file()
+    snapshot_interval: int = 1000
+
+    # Length of working_script at the last snapshot
+    last_snapshot_length: int = 0
+
+    # Background writer for snapshots
+    snapshot_writer: SnapshotWriter
+
+    # Byte offset in the history file of each working_script component
+    # written to it since the performance started or was reset, by index;
+    # see truncate()
+    journal_offsets: dict
+
+    # Performance this one was forked from (see fork()), and the length of
+    # its working_script at the time; forks don't write history files
+    parent: Optional["Performance"] = None
+    fork_base_length: int = 0
+
+    # Background writer for log.txt
+    log_writer: LogWriter
+
+    # Maximum number of queued log messages, what to do when the queue is
+    # full ("drop" or "block"), and size at which log.txt is rotated (0 for
+    # never) keeping log_backup_count old logs
+    log_queue_size: int = 1024
+    log_full_policy: str = "drop"
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_backup_count: int = 3
+
+    # Generator used for every generate_dialogue() call
+    generator: Generator
+
+    # Filters generated components must pass; none by default (e.g.
+    # register filter_non_alphabetical for models that emit punctuation-only
+    # lines; it rejects non-Latin dialogue)
+    component_validator: ValidationPipeline
+
     # Chatbots to use for generating dialogue
     #@REVISIT consider moving into Generator if we refactor away from classmethod
-    chatbots: List[AutoChatbot] = []
+    chatbots: List[ChatbotView]
 
     # An array of integers representing how many script components each chatbot
     # has in its context.
-    chatbot_states = []
+    chatbot_states: List[int]
+
+    # Cached chatbot context snapshots, keyed by the script prefix they encode
+    context_cache: ContextCache
+
+    # Memory budget of context_cache, in bytes
+    context_cache_budget: int = 256 * 1024 * 1024
+
+    # Hash of each prefix of working_script; [i] covers components 0 to i
+    script_prefix_hashes: SharedPrefixList
+
+    # Each working_script component rendered in script_format, with its break
+    rendered_components: SharedPrefixList
+
+    # Join of rendered_components[:rendered_script_length]
+    rendered_script: str = ""
+    rendered_script_length: int = 0
+
+    # Renders of working_script in other formats, as (string, number of
+    # components rendered) by ScriptFormat; see get_script()
+    format_renders: dict
+
+    # Maximum number of tokens of working_script to include in a prompt; the
+    # newest components (and the current scene header) are kept. None for no
+    # limit.
+    context_token_budget: Optional[int] = None
+
+    # Fraction of context_token_budget filled when the context of a chatbot
+    # that keeps context is rebuilt, leaving room for new lines before the
+    # next rebuild
+    context_rebuild_fraction: float = 0.5
+
+    # Token counts of working_script for each chatbot, by chatbot index
+    context_windows: dict
+
+    # Cached (bot, human) character descriptions; None when stale
+    performer_descriptions: Optional[tuple] = None
 
     # Performance (fallback) chatbot config
     model_config: Optional[dict] = None
@@ -86,14 +187,14 @@ class Performance:
 
     # List of performers in the performance
     performers: dict
-    bot_performers: list = []
-    human_performers: list = []
+    bot_performers: list
+    human_performers: list
 
-    # Currently playing audio objects
-    active_play_objs: list = []
+    # Currently playing audio objects, and a lock guarding the list so that
+    # interrupt() can be called from any thread
+    active_play_objs: list
+    play_objs_lock: threading.Lock
 
-    # Characters who have spoken
-    character_history: list = []
 
     #performance_type #@TODO i.e. round-robin, random, personality-dependent, etc.
 
@@ -103,8 +204,24 @@ class Performance:
         model_config: Optional[dict] = None, #@REVISIT consider making config class
         resume_from_log: bool = False,
     ):
-        self.working_script = []
+        self.working_script = WorkingScript()
+        self.script_prefix_hashes = SharedPrefixList()
+        self.rendered_components = SharedPrefixList()
+        self.format_renders = {}
+        self.context_windows = {}
+        self.journal_offsets = {}
         self.performers = {}
+        self.bot_performers = []
+        self.human_performers = []
+        self.chatbots = []
+        self.chatbot_states = []
+        self.active_play_objs = []
+        self.play_objs_lock = threading.Lock()
+        self.context_cache = ContextCache(self.context_cache_budget)
+        self.snapshot_writer = SnapshotWriter()
+        self.generator = Generator(self)
+
+        self.component_validator = ValidationPipeline()
 
         if(not logdir):
             self.logdir = appdirs.user_log_dir("bot-aukerman", "bot-aukerman")
@@ -114,8 +231,9 @@ class Performance:
         # Initialize chatbot if model is set
         if model_config:
             # Because we will parse the response and feed it back to chatbot,
-            # we want chatbot's unparsed response kept out of context
-            model_config["keep_response_in_context"] = False
+            # we want chatbot's unparsed response kept out of context; this
+            # only applies to our view, so the engine can still be shared
+            model_config = dict(model_config, keep_response_in_context = False)
 
             # Initialize chatbot, save its index in chatbots[]
             self.performance_chatbot_index = self._init_chatbot(model_config)
@@ -129,36 +247,184 @@ class Performance:
         # Create logdir if it doesn't exist
         os.makedirs(self.logdir, exist_ok=True)
 
+        # Ensure logdir ends with a slash
+        if(self.logdir[-1] != "/"):
+            self.logdir += "/"
+
+        # Open journal lazily; an existing history file is handled below first
+        self.journal = ScriptJournal(
+                self.logdir + "current-dialogue-history.txt",
+                flush_policy = self.journal_flush_policy,
+                flush_interval = self.journal_flush_interval,
+                fsync = self.journal_fsync)
+
+        # Log writer thread starts on first message
+        self.log_writer = LogWriter(self.logdir + "log.txt",
+                                    max_queue_size = self.log_queue_size,
+                                    full_policy = self.log_full_policy,
+                                    max_bytes = self.log_max_bytes,
+                                    backup_count = self.log_backup_count)
+
         # Load current-dialogue-history.txt into working_script if it exists:
         if(resume_from_log):
-            self.load_script_file("current-dialogue-history.txt")
+            self.resume_script_file("current-dialogue-history.txt")
 
         # If logdir is set and current-dialogue-history.txt exists, rename it:
         elif(self.logdir):
-            # Ensure logdir ends with a slash
-            if(self.logdir[-1] != "/"):
-                self.logdir += "/"
+            self.archive_history_file()
 
-            if(os.path.isfile(self.logdir + "current-dialogue-history.txt")):
-                # Rename file to dialogue-history_[file creation time].txt:
-                #@REVISIT i let github copilot do its thing here; clean up:
-                file_creation_time = datetime.datetime.fromtimestamp(
-                    os.path.getctime(self.logdir + "current-dialogue-history.txt")
-                ).strftime("%Y-%m-%d_%H-%M-%S")
+    def archive_history_file(self):
+        """
+        Rename current-dialogue-history.txt (if any) to
+        dialogue-history_[file creation time].txt and remove its snapshot, so
+        the script starts a new history file.
+        """
 
-                os.rename(self.logdir + "current-dialogue-history.txt",
-                          f"{self.logdir}dialogue-history_{file_creation_time}.txt")
+        if(os.path.isfile(self.journal.path)):
+            # Rename file to dialogue-history_[file creation time].txt:
+            #@REVISIT i let github copilot do its thing here; clean up:
+            file_creation_time = datetime.datetime.fromtimestamp(
+                os.path.getctime(self.journal.path)
+            ).strftime("%Y-%m-%d_%H-%M-%S")
+
+            archive_path = f"{self.logdir}dialogue-history_{file_creation_time}.txt"
+
+            # Don't replace an archive from earlier in the same second
+            archive_number = 1
+            while(os.path.exists(archive_path)):
+                archive_path = f"{self.logdir}dialogue-history_" \
+                        + f"{file_creation_time}_{archive_number}.txt"
+                archive_number += 1
+
+            self.journal.rotate(archive_path)
+
+        # Remove snapshot of the renamed history file
+        self.remove_snapshot()
 
     def load_script_file(self, filename: str):
         """
         Load dialogue history from a file into working_script.
         """
 
-        if(os.path.isfile(self.logdir + filename)):
-            with open(self.logdir + filename, "r") as f:
-                dialogue_file_str = f.read()
+        if(not os.path.isfile(self.logdir + filename)):
+            return
+
+        # Stream components from the mapped file into working_script
+        script_components = iter_script_file(self.logdir + filename)
+
+        # If working_script is not empty
+        if(self.working_script):
+            # Warn user that working_script will be overwritten
+            print("WARNING: working_script is not empty; " \
+                  + "loading script will overwrite it.")
+
+            # Read the file before reset() archives it, in case it is the
+            # history file itself
+            script_components = list(script_components)
+
+            # Reset performance
+            self.reset()
+
+        self.add_components(script_components)
+
+    def resume_script_file(self, filename: str = "current-dialogue-history.txt"):
+        """
+        Resume working_script from a history file written by this class.
+
+        If the file has a binary snapshot, the snapshot is loaded and only the
+        text written after it is interpreted. Resumed components are not
+        written to the history file again.
+        """
+
+        script_path = self.logdir + filename
+        if(not os.path.isfile(script_path)):
+            return
+
+        journal_offset = 0
+
+        # Load snapshot if there is a valid one for this file
+        snapshot_path = self.get_snapshot_path(filename)
+        if(os.path.isfile(snapshot_path)):
+            try:
+                snapshot = read_snapshot(snapshot_path)
+
+                if snapshot.journal_offset <= os.path.getsize(script_path):
+                    self.restore_snapshot(snapshot)
+                    journal_offset = snapshot.journal_offset
+                else:
+                    # Remove it, or it would be restored once the file grows
+                    # past its offset, against text it doesn't match
+                    warn(f"snapshot is ahead of {filename}; removing it")
+                    os.remove(snapshot_path)
+
+            except ValueError as e:
+                warn(f"removing invalid snapshot: {e}")
+                os.remove(snapshot_path)
+
+        # Interpret the text written after the snapshot
+        for component in iter_script_file(script_path, offset = journal_offset):
+            self.add_component(component, write_journal = False)
+
+        self.last_snapshot_length = len(self.working_script)
+
+    def restore_snapshot(self, snapshot: ScriptSnapshot):
+        """
+        Load a snapshot's script into the (empty) performance.
+        """
+
+        for component in snapshot.working_script:
+            self.add_component(component, write_journal = False)
+
+        # snapshot.chatbot_states is not restored; chatbot contexts don't
+        # survive a restart, so every chatbot starts from an empty context
 
-            self.load_script_string(dialogue_file_str)
+    def write_snapshot(self):
+        """
+        Write a binary snapshot of the script next to the history file, in the
+        background.
+
+        The snapshot covers the history file up to the current offset, which
+        reaches the file according to journal_flush_policy; snapshots ahead
+        of the file are ignored when resuming.
+        """
+
+        # Forking is O(1) and later components don't reach the fork, so the
+        # writer thread can read it while the script grows
+        working_script = self.working_script.fork()
+        journal_offset = self.journal.get_offset()
+        chatbot_states = list(self.chatbot_states)
+
+        def make_snapshot() -> ScriptSnapshot:
+            return ScriptSnapshot(
+                    journal_offset = journal_offset,
+                    working_script = list(working_script),
+                    character_history = working_script.get_character_history(),
+                    chatbot_states = chatbot_states)
+
+        self.snapshot_writer.submit(self.get_snapshot_path(), make_snapshot)
+
+        self.last_snapshot_length = len(self.working_script)
+
+    def remove_snapshot(self):
+        """
+        Delete the binary snapshot of the history file, if any.
+        """
+
+        # Don't let a pending snapshot be written after removing it
+        self.snapshot_writer.cancel()
+
+        if(os.path.isfile(self.get_snapshot_path())):
+            os.remove(self.get_snapshot_path())
+
+        self.last_snapshot_length = 0
+
+    def get_snapshot_path(self,
+                          filename: str = "current-dialogue-history.txt") -> str:
+        """
+        Get the path of the binary snapshot of a history file.
+        """
+
+        return self.logdir + os.path.splitext(filename)[0] + ".snapshot"
 
     def load_script_string(self, script_str: str):
         """
@@ -182,27 +448,62 @@ class Performance:
         # self.working_script = script_components
         self.add_components(script_components)
 
+    @property
+    def character_history(self) -> List[str]:
+        """
+        Uppercase names of the characters who have spoken, in order.
+        """
+
+        return self.working_script.get_character_history()
+
     #@REVISIT naming
-    def get_script(self):
+    def get_script(self, script_format: Optional[ScriptFormat] = None) -> str:
         """
-        Get the working script.
+        Get the working script as a string, in script_format by default.
+
+        Renders are cached and extended as components are added, so getting an
+        unchanged script is O(1).
         """
 
-        # Return the working script_components as a string
-        return self.components_to_str(self.working_script)
+        if script_format is None or script_format == self.script_format:
+            return self.get_rendered_script()
+
+        # Render components added since the last call in this format
+        rendered_script, rendered_length = self.format_renders.get(script_format,
+                                                                   ("", 0))
+
+        if rendered_length < len(self.working_script):
+            new_components = self.working_script[rendered_length:]
+            rendered_script += Generator.components_to_str(new_components,
+                                                           script_format)
+
+            self.format_renders[script_format] = (rendered_script,
+                                                  len(self.working_script))
+
+        return rendered_script
 
     def reset(self):
         """
         Reset the performance.
         """
 
-        # Reset working script
-        self.working_script = []
-
-        # Reset character history
-        self.character_history = []
+        if self.parent is None:
+            # Start a new history file, as a new performance would, so
+            # resuming gives the same (reset) script
+            self.archive_history_file()
+            self.journal_offsets = {}
 
-        # Reset chatbots
+        # Reset working script
+        self.working_script = WorkingScript()
+        self.script_prefix_hashes = SharedPrefixList()
+        self.rendered_components = SharedPrefixList()
+        self.rendered_script = ""
+        self.rendered_script_length = 0
+        self.format_renders = {}
+        self.context_windows = {}
+
+        # Reset chatbots; context_cache is kept so that reloading the same
+        # script can restore their contexts
         for chatbot in self.chatbots:
             chatbot.clear_context()
 
@@ -239,9 +540,9 @@ class Performance:
         Initialize chatbot.
         """
 
-        #@TODO consider reusing chatbots with identical model_config
-        # Load chatbot
-        chatbot = AutoChatbot(model_config = model_config)
+        # Get a view on the (possibly already loaded) chatbot; performers with
+        # identical model_config share one model, each with its own context
+        chatbot = model_registry.acquire(model_config)
 
         # Add chatbot to list of chatbots
         self.chatbots.append(chatbot)
@@ -253,6 +554,105 @@ class Performance:
 
         return chatbot_index
 
+    def close(self):
+        """
+        Release resources held by the performance.
+        """
+
+        # Write out and close history file, snapshot and log (shared by forks)
+        if self.parent is None:
+            self.journal.close()
+            self.snapshot_writer.wait()
+            self.log_writer.close()
+
+        # Release chatbots; models no longer used anywhere are unloaded
+        for chatbot in self.chatbots:
+            model_registry.release(chatbot)
+
+        self.chatbots = []
+        self.chatbot_states = []
+
+    def fork(self) -> "Performance":
+        """
+        Make a branch of the performance to generate alternative continuations
+        in; see commit().
+
+        The fork shares the script so far and the context cache with this
+        performance, and gets its own views on the same chatbots, starting
+        from their current contexts; nothing is copied until either side adds
+        components. Forks don't write the history file or snapshots. Close
+        forks that aren't committed.
+        """
+
+        fork = copy.copy(self)
+        fork.parent = self
+        fork.fork_base_length = len(self.working_script)
+
+        fork.working_script = self.working_script.fork()
+        fork.script_prefix_hashes = self.script_prefix_hashes.fork()
+        fork.rendered_components = self.rendered_components.fork()
+        fork.format_renders = self.format_renders.copy()
+        fork.context_windows = {
+            chatbot_index: window.fork(fork)
+            for chatbot_index, window in self.context_windows.items()
+        }
+
+        fork.performers = self.performers.copy()
+        fork.bot_performers = self.bot_performers.copy()
+        fork.human_performers = self.human_performers.copy()
+        fork.active_play_objs = []
+        fork.play_objs_lock = threading.Lock()
+
+        fork.chatbots = [model_registry.share(chatbot)
+                         for chatbot in self.chatbots]
+        fork.chatbot_states = self.chatbot_states.copy()
+
+        fork.generator = Generator(fork)
+
+        return fork
+
+    def commit(self, fork: "Performance"):
+        """
+        Adopt a fork's continuation: add the components it generated and take
+        over its chatbot contexts. The fork is closed.
+
+        Raises ValueError if fork isn't a fork of this performance, if the
+        fork was cut below the point it was forked at, or if this performance
+        has changed since the fork was made.
+        """
+
+        if fork.parent is not self:
+            raise ValueError("not a fork of this performance")
+
+        base_length = fork.fork_base_length
+        if len(fork.working_script) < base_length:
+            raise ValueError("fork was cut below its base")
+
+        if len(self.working_script) != base_length \
+                or self.get_prefix_hash(base_length) \
+                != fork.get_prefix_hash(base_length):
+            raise ValueError("performance has changed since it was forked")
+
+        self.add_components(fork.working_script[base_length:])
+
+        # Take over fork's chatbot contexts, which match the new script
+        for chatbot_index, chatbot in enumerate(self.chatbots):
+            fork_chatbot = fork.chatbots[chatbot_index]
+            chatbot.set_view_context(fork_chatbot.get_view_context())
+            self.chatbot_states[chatbot_index] = fork.chatbot_states[chatbot_index]
+
+        # Catch up this performance's own windows rather than taking the
+        # fork's, whose counts are layered on this performance's
+        for chatbot_index, fork_window in fork.context_windows.items():
+            window = self.context_windows.get(chatbot_index)
+            if window is None:
+                window = ContextWindow(self, fork_window.count_tokens)
+                self.context_windows[chatbot_index] = window
+
+            window.adopt(fork_window)
+
+        fork.close()
+
     #@TODO need to reevaluate all of these start_* methods; useful? good?
     def start(self):
         """
@@ -417,6 +817,7 @@ class Performance:
 
         # Add the performer to the list of performers
         self.performers[performer.character_name.upper()] = performer
+        self.performer_descriptions = None
 
         # Add the performer to the list of bot performers
         self.bot_performers.append(performer)
@@ -438,6 +839,7 @@ class Performance:
 
         # Add the performer to the list of performers
         self.performers[performer.character_name.upper()] = performer
+        self.performer_descriptions = None
 
         # Add the performer to the list of human performers
         self.human_performers.append(performer)
@@ -458,6 +860,7 @@ class Performance:
             return False
 
         self.add_component(components[0])
+        self.journal.end_turn()
 
     def add_description(self, description: str):
         """
@@ -473,6 +876,7 @@ class Performance:
             return False
 
         self.add_component(components[0])
+        self.journal.end_turn()
 
     # Add one or multiple instances of dialogue to the dialogue history
     def add_dialogue(self, dialogue) -> bool:
@@ -514,57 +918,235 @@ class Performance:
         else:
             print("ERROR: Invalid dialogue type:", type(dialogue))
 
+        self.journal.end_turn()
 
         return True
 
-    def add_components(self, components: List[ScriptComponentType]):
+    def add_components(self, components: Iterable[ScriptComponentType]):
         """
-        Add a list of script components to the working script.
+        Add script components (a list or e.g. a generator from
+        iter_script_file()) to the working script.
         """
 
         for component in components:
             self.add_component(component)
 
+        self.journal.end_turn()
+
         return True
 
-    def add_component(self, component: ScriptComponent):
+    def add_component(self,
+                      component: ScriptComponent,
+                      write_journal: bool = True):
         """
         Add a script component to the working script.
+
+        If write_journal is set, the component is also written to the history
+        file (and a snapshot written if one is due).
         """
 
-        # Add component to working script
+        # Add component to working script (which also tracks its speaker)
         self.working_script.append(component)
 
-        # If component is Dialogue
-        if isinstance(component, Dialogue):
-            # Add performer to character_history
-            self.character_history.append(component.character_name.upper())
+        # Render component once for prompts, hashing and the history file
+        rendered_component = component.to_str() \
+                + Generator.break_component(self.script_format)
+        self.rendered_components.append(rendered_component)
+
+        # Extend prefix hash chain
+        previous_hash = self.get_prefix_hash(len(self.script_prefix_hashes))
+        self.script_prefix_hashes.append(hash((previous_hash,
+                                               rendered_component)))
 
-        # Write component line to file
-        with open(self.logdir + "current-dialogue-history.txt",
-                  mode = "a+",
-                  encoding = "utf-8") as f:
-            f.write(component.to_str())
-            f.write(Generator.break_component(self.script_format))
+        if write_journal and self.parent is None:
+            # Write component line to file, noting where it starts
+            self.journal_offsets[len(self.working_script) - 1] \
+                    = self.journal.get_offset()
+            self.journal.write(rendered_component)
+
+            # Write snapshot if due
+            if self.snapshot_interval and len(self.working_script) \
+                    - self.last_snapshot_length >= self.snapshot_interval:
+                self.write_snapshot()
 
         return True
 
+    def rewind(self, num_components: int = 1):
+        """
+        Remove the last num_components components of the working script; see
+        truncate().
+        """
+
+        self.truncate(max(0, len(self.working_script) - num_components))
+
+    def truncate(self, length: int):
+        """
+        Cut the working script (and history file) down to its first length
+        components.
+
+        Chatbots whose context covers cut components are rolled back to the
+        longest cached context snapshot of the remaining script, or emptied if
+        there is none; chatbots whose context ends before the cut are left
+        alone.
+        """
+
+        if length >= len(self.working_script):
+            return
+
+        if length < 0:
+            raise ValueError(f"invalid script length: {length}")
+
+        if self.parent is None:
+            self.truncate_journal(length)
+
+        # Drop rendered text of cut components
+        if self.rendered_script_length > length:
+            cut_components = self.rendered_components[length:self.rendered_script_length]
+            cut_characters = sum(len(rendered_component)
+                                 for rendered_component in cut_components)
+            self.rendered_script = \
+                    self.rendered_script[:len(self.rendered_script) - cut_characters]
+            self.rendered_script_length = length
+        self.format_renders = {}
+
+        # Truncated copies, as forks may share the originals
+        self.working_script = self.working_script.truncated(length)
+        self.rendered_components = self.rendered_components.truncated(length)
+        self.script_prefix_hashes = self.script_prefix_hashes.truncated(length)
+        self.context_windows = {
+            chatbot_index: window.truncated(length)
+            for chatbot_index, window in self.context_windows.items()
+        }
+
+        # Roll back chatbots; a context of exactly length components also
+        # ends with the name cue of the first cut line
+        for chatbot_index, chatbot_state in enumerate(self.chatbot_states):
+            if chatbot_state < length or chatbot_state == 0:
+                continue
+
+            self.chatbots[chatbot_index].set_view_context(None)
+            self.chatbot_states[chatbot_index] = 0
+
+            if self.chatbots[chatbot_index].keep_context:
+                self.generator.restore_context_snapshot(chatbot_index, length)
+
+    def truncate_journal(self, length: int):
+        """
+        Cut the history file down to the first length components of the
+        working script.
+        """
+
+        self.journal.flush()
+
+        offset = self.journal_offsets.get(length)
+
+        # Components written this session can be cut off the end of the file
+        if offset is not None:
+            self.journal.truncate(offset)
+
+        # Otherwise the cut reaches into resumed components; rewrite the file
+        else:
+            rendered_script = "".join(self.rendered_components[:length])
+            self.journal.rewrite(rendered_script)
+
+        for index in range(length, len(self.working_script)):
+            self.journal_offsets.pop(index, None)
+
+        # Snapshot covers cut components or no longer matches the file
+        if offset is None or self.last_snapshot_length > length:
+            self.remove_snapshot()
+
+    def get_rendered_script(self) -> str:
+        """
+        Get working_script rendered in script_format.
+
+        Only components added since the last call are joined onto the cached
+        string.
+        """
+
+        if self.rendered_script_length < len(self.rendered_components):
+            new_components = self.rendered_components[self.rendered_script_length:]
+            self.rendered_script += "".join(new_components)
+            self.rendered_script_length = len(self.rendered_components)
+
+        return self.rendered_script
+
+    def get_context_window(self, chatbot_index: int) -> ContextWindow:
+        """
+        Get the token-counting context window for a chatbot.
+        """
+
+        if chatbot_index not in self.context_windows:
+            chatbot = self.chatbots[chatbot_index]
+
+            # Use chatbot's tokenizer if it exposes one
+            count_tokens = getattr(chatbot, "count_tokens", None)
+            if not callable(count_tokens):
+                count_tokens = approximate_token_count
+
+            self.context_windows[chatbot_index] = ContextWindow(self,
+                                                                count_tokens)
+
+        return self.context_windows[chatbot_index]
+
+    def get_performer_descriptions(self) -> tuple:
+        """
+        Get the descriptions of bot and human characters, one per line.
+
+        Cached until a performer is added.
+        """
+
+        if self.performer_descriptions is None:
+            bot_descriptions = []
+            human_descriptions = []
+
+            for performer in self.performers.values():
+                # If performer is a bot
+                if isinstance(performer, BotPerformer):
+                    bot_descriptions.append(performer.get_description())
+                # If performer is a human
+                elif isinstance(performer, HumanPerformer):
+                    human_descriptions.append(performer.get_description())
+                else:
+                    raise Exception("Invalid performer type.")
+
+            self.performer_descriptions = ("\n".join(bot_descriptions),
+                                           "\n".join(human_descriptions))
+
+        return self.performer_descriptions
+
+    def get_prefix_hash(self, length: int) -> int:
+        """
+        Get the hash of the first length components of working_script.
+        """
+
+        if length == 0:
+            return 0
+
+        return self.script_prefix_hashes[length - 1]
+
     def generate_dialogue(self,
                           num_lines = 1,
                           character_idx = None,
                           return_as = "list",
+                          on_component: Optional[Callable] = None,
                           ):
         """
         Generate new dialogue for characters and add it to the working script.
+
+        If on_component is set, it is called with each generated component as
+        soon as it is available (e.g. to start performing the first line while
+        the rest are still being generated).
         """
 
-        # Generate dialogue
-        dialogue_components = Generator.generate(self,
-                                                 num_lines,
-                                                 character_idx) #@REVISIT
+        # Generate dialogue; Generator adds the lines to the working script
+        dialogue_components = self.generator.generate_dialogue(
+                num_lines = num_lines,
+                character_idx = character_idx,
+                on_component = on_component)
 
-        # Add dialogue lines to dialogue history
-        self.add_dialogue(dialogue_components)
+        # End of turn for the history file
+        self.journal.end_turn()
 
         match return_as:
             case "list":
@@ -572,7 +1154,7 @@ class Performance:
             case "str" | "string" | "text":
                 return self.components_to_str(dialogue_components)
 
-    def components_to_str(self, components: List[ScriptComponentType]) -> str:
+    def components_to_str(self, components: Iterable[ScriptComponentType]) -> str:
         """
         Convert a list of script components to a string.
         """
@@ -603,48 +1185,50 @@ class Performance:
         Perform a single script component.
         """
 
-        # If line is a scene header
-        #@REVISIT should we rather have a ScriptComponent.type attribute?
-        if isinstance(script_component, SceneHeader):
-            if __debug__:
-                print("=====================================")
-                print("Performing scene header:", script_component.to_str())
-            return
-
-        # If line is scene action
-        elif isinstance(script_component, SceneAction):
-            if __debug__:
-                print("=====================================")
-                print("Performing scene action:", script_component.to_str())
-            return
-
-        # If line is a dialogue line
-        elif isinstance(script_component, Dialogue):
-            if __debug__ and self.verbose:
-                print("=====================================")
-                print("Performing dialogue for",
-                      script_component.character_name,
-                      ": ",
-                      script_component.dialogue)
-
-            # Get performer
-            character_name = script_component.character_name
-            performer = self.get_performer(character_name)
-
-            # If the performer is a BotPerformer
-            if isinstance(performer, BotPerformer):
-                # Perform the line
-                try:
-                    self.perform_dialogue(script_component)
-                    # performer.perform(script_component, self.tts)
-                except TypeError as e:
-                    warn(f"{e}")
-
-                # if(self.tts):
-                #     self.tts.say(script_component.dialogue,
-                #                  speaker=performer.speaker)
-                # else:
-                #     print(f"WARNING: No TTS set for bot {performer.speaker}")
+        match script_component.component_type:
+            # If line is a scene header
+            case "scene_header":
+                if __debug__:
+                    print("=====================================")
+                    print("Performing scene header:", script_component.to_str())
+                return
+
+            # If line is scene action
+            case "scene_action":
+                if __debug__:
+                    print("=====================================")
+                    print("Performing scene action:", script_component.to_str())
+                return
+
+            # If line is a dialogue line
+            case "dialogue":
+                assert isinstance(script_component, Dialogue)
+
+                if __debug__ and self.verbose:
+                    print("=====================================")
+                    print("Performing dialogue for",
+                          script_component.character_name,
+                          ": ",
+                          script_component.dialogue)
+
+                # Get performer
+                character_name = script_component.character_name
+                performer = self.get_performer(character_name)
+
+                # If the performer is a BotPerformer
+                if isinstance(performer, BotPerformer):
+                    # Perform the line
+                    try:
+                        self.perform_dialogue(script_component)
+                        # performer.perform(script_component, self.tts)
+                    except TypeError as e:
+                        warn(f"{e}")
+
+                    # if(self.tts):
+                    #     self.tts.say(script_component.dialogue,
+                    #                  speaker=performer.speaker)
+                    # else:
+                    #     print(f"WARNING: No TTS set for bot {performer.speaker}")
 
     def perform_dialogue(self, dialogue):
         tts = self.tts
@@ -688,7 +1272,8 @@ class Performance:
             play_obj = tts.say(**args)
 
             # Store play_obj for possible interruption
-            self.active_play_objs.append(play_obj)
+            with self.play_objs_lock:
+                self.active_play_objs.append(play_obj)
 
             return play_obj
 
@@ -699,14 +1284,89 @@ class Performance:
             else:
                 print("WARNING: No TTS for dialogue")
 
+    def synthesize_dialogue(self, dialogue: Dialogue) -> Optional[tuple]:
+        """
+        Synthesize a line's speech without playing it, as (16-bit mono PCM
+        bytes, sample rate); None if there is no speech or no TTS engine that
+        can synthesize.
+        """
+
+        synthesize_speech = self.prepare_synthesis(dialogue)
+        if synthesize_speech is None:
+            return None
+
+        return synthesize_speech()
+
+    def prepare_synthesis(self,
+                          dialogue: Dialogue) -> Optional[Callable[[], tuple]]:
+        """
+        Get a function that synthesizes a line's speech (see
+        synthesize_dialogue()); it doesn't touch the performance, so it can
+        run on another thread. None if there is nothing to synthesize.
+        """
+
+        performer = self.get_performer(dialogue.character_name.upper())
+        assert isinstance(performer, BotPerformer)
+
+        tts = performer.tts or self.tts
+
+        #@REVISIT CoquiImp only offers say(); engines with a
+        # synthesize(text, speaker) method returning (samples, sample_rate)
+        # are used
+        synthesize = getattr(tts, "synthesize", None)
+        if not callable(synthesize):
+            return None
+
+        text = self.extract_speech_from_dialogue(dialogue)
+        if text == "":
+            return None
+
+        speaker = performer.speaker
+
+        def synthesize_speech() -> tuple:
+            samples, sample_rate = synthesize(text = text, speaker = speaker)
+
+            # Float samples in [-1, 1] are converted to 16-bit PCM
+            if not isinstance(samples, bytes):
+                samples = array("h", (
+                    int(max(-1.0, min(1.0, sample)) * 32767)
+                    for sample in samples
+                )).tobytes()
+
+            return samples, sample_rate
+
+        return synthesize_speech
+
     def interrupt(self):
         """
         Interrupt any TTS.
         """
 
-        for play_obj in self.active_play_objs:
+        for play_obj in self.get_active_play_objs():
             play_obj.stop()
 
+    def get_active_play_objs(self) -> list:
+        """
+        Get a copy of the list of play objects.
+        """
+
+        with self.play_objs_lock:
+            return list(self.active_play_objs)
+
+    def remove_finished_play_objs(self) -> list:
+        """
+        Forget play objects whose audio has finished; returns those still
+        playing.
+        """
+
+        with self.play_objs_lock:
+            self.active_play_objs = [
+                play_obj for play_obj in self.active_play_objs
+                if play_obj.is_playing()
+            ]
+
+            return list(self.active_play_objs)
+
     def extract_speech_from_dialogue(self, dialogue: Dialogue):
         # Split dialogue into parentheticals and dialogue
         subcomponents = dialogue.split_parens_and_dialogue()
@@ -739,8 +1399,6 @@ class Performance:
         if __debug__ and self.verbose:
             print(message)
 
-        # If logdir is set, write message to file
+        # If logdir is set, queue message for the log writer thread
         if(self.logdir):
-            open(self.logdir + "log.txt",
-                 mode = "a",
-                 encoding = "utf-8").write(message)
+            self.log_writer.write(message)
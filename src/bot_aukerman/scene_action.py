@@ -1,6 +1,10 @@
 from .script_component import ScriptComponent
 
 class SceneAction(ScriptComponent):
+    __slots__ = ("action",)
+
+    component_type = "scene_action"
+
     action: str
 
     def __init__(self, action):
@@ -2,7 +2,14 @@ import re
 
 from .script_component import ScriptComponent
 
+# Matches the INT/EXT prefix that begins a scene header
+LOCATION_PREFIX_REGEX = re.compile(r"^(INT|EXT)\.?\s")
+
 class SceneHeader(ScriptComponent):
+    __slots__ = ("location_prefix", "location", "time")
+
+    component_type = "scene_header"
+
     # scene_number: int
     location_prefix: str
     location: str
@@ -27,43 +34,40 @@ class SceneHeader(ScriptComponent):
     def from_str(header_string):
         header_string = header_string.strip()
 
-        location_prefix = ""
-        location = ""
-        time = ""
-
         # Search for location prefix
-        location_prefix_regex = re.compile(r"^(INT|EXT)\.?\s")
-        location_prefix_match = location_prefix_regex.search(header_string)
-        if(location_prefix_match):
-            # Set location prefix
-            location_prefix = location_prefix_match.group(1)
-
-            # Remove location prefix from header string
-            header_string = header_string[location_prefix_match.end():]
-        else:
+        location_prefix_match = LOCATION_PREFIX_REGEX.search(header_string)
+        if(not location_prefix_match):
             raise ValueError("no location prefix found in header_string: " \
                              + header_string)
 
+        return SceneHeader.from_prefix_match(header_string,
+                                             location_prefix_match)
+
+    @staticmethod
+    def from_prefix_match(header_string, location_prefix_match):
+        """
+        Create a SceneHeader from a stripped header string and its
+        LOCATION_PREFIX_REGEX match.
+        """
+
+        location = ""
+        time = ""
+
+        # Set location prefix
+        location_prefix = location_prefix_match.group(1)
+
+        # Remove location prefix from header string
+        header_string = header_string[location_prefix_match.end():]
+
         # Split on dash
         dash_split = header_string.split("-", 1)
 
-        # If there is no dash
-        if(len(dash_split) == 1):
-            # Set location
-            location = dash_split[0].strip()
-
-        # If there is a dash
-        elif(len(dash_split) == 2):
-            # Set location
-            location = dash_split[0].strip()
+        # Set location
+        location = dash_split[0].strip()
 
-            # Set time
+        # If there is a dash, set time
+        if(len(dash_split) == 2):
             time = dash_split[1].strip()
 
-        # If there are more than 2 dashes
-        else:
-            raise ValueError("more than one dash found in header_string: " \
-                             + header_string)
-
         # Create and return SceneHeader
         return SceneHeader(location_prefix, location, time)
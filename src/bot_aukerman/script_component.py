@@ -1,4 +1,10 @@
 class ScriptComponent:
+    # Subclasses declare their own slots; no per-instance __dict__
+    __slots__ = ()
+
+    # Type tag for dispatching on component type without isinstance()
+    component_type: str = "component"
+
     def __init__(self):
         pass
 
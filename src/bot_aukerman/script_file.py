@@ -0,0 +1,51 @@
+"""
+Memory-mapped reading of script files.
+
+Large script files are mapped rather than read into a string, and decoded one
+line at a time, so only the current line and the components not yet consumed
+are held in memory.
+"""
+
+import os
+import re
+import mmap
+from typing import Iterator
+
+from .script_component import ScriptComponent
+from .interpreter import Interpreter
+
+# Line endings, read the same way as open()'s universal newlines
+NEWLINE_REGEX = re.compile(rb"\r\n|\r|\n")
+
+def iter_file_lines(path: str, offset: int = 0) -> Iterator[str]:
+    """
+    Yield the lines of a UTF-8 file from byte offset on, without newlines.
+
+    Lines are split the same way as str.split("\\n") (a trailing newline gives
+    a final empty line); "\\r\\n" and lone "\\r" line endings are read as
+    "\\n", as they would be by open() in text mode.
+    """
+
+    with open(path, "rb") as f:
+        # mmap can't map empty files
+        if os.fstat(f.fileno()).st_size <= offset:
+            yield ""
+            return
+
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mapped:
+            position = offset
+            for newline in NEWLINE_REGEX.finditer(mapped, offset):
+                yield mapped[position:newline.start()].decode("utf-8")
+                position = newline.end()
+
+            yield mapped[position:].decode("utf-8")
+
+def iter_script_file(path: str,
+                     flags = [],
+                     offset: int = 0) -> Iterator[ScriptComponent]:
+    """
+    Interpret a script file lazily, yielding components as they are parsed.
+    """
+
+    return Interpreter.interpret_lines(iter_file_lines(path, offset),
+                                       flags = flags)
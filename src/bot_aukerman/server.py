@@ -4,65 +4,827 @@ Bot Aukerman server module.
 This module contains the Server class, which is responsible for receiving
 requests/data from other processes, processing them in the context of a
 Performance, and sending back a response.
+
+The server runs an event loop on a zmq.Poller: it sleeps until a client
+request arrives or another thread (STT input, finished audio playback, job
+workers) sends an event over an inproc socket.
+
+Requests arrive on a ROUTER socket (REQ and DEALER clients both work) and are
+answered immediately. Generation runs as a job on a worker thread: the reply
+carries a job_id, and the job's progress and result are published on a PUB
+socket (and can be fetched with a get_job message), so control messages such
+as interrupt are handled while generation is in flight.
+
+The server hosts any number of sessions, each with its own Performance; most
+messages take a session_id (the default session if omitted). Sessions share
+loaded models through the model registry.
+
+Each generated line is also published on
+session/<session_id>/performer/<NAME>/line/, followed, for sessions streaming
+audio, by its synthesized speech in chunks on
+session/<session_id>/performer/<NAME>/audio/. ZMQ subscriptions match topic
+prefixes, so subscribe with the trailing slash (e.g. "session/a/" or
+"session/a/performer/BOB/") to avoid also matching session "ab" or performer
+"BOBBY".
+
+Requests that arrive together are handled by priority: interrupt, then
+observe_user_input, then the rest. Each session runs one job at a time,
+highest priority first (see Server.job_priorities). A session's queue is
+bounded; requests beyond it are rejected with a retry_after hint. When the
+human speaks, queued request_dialogue jobs are coalesced into the newest one
+for each character_idx, which then runs on the updated script.
 """
 
-from typing import Optional
+from typing import Optional, Dict, Callable
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import simpleaudio as sa
+import itertools
+import threading
+import appdirs
+import heapq
+import json
+import uuid
 import zmq
 import time
+import os
+import re
 
 from .performance import Performance
+from .dialogue import Dialogue
+from .bot_performer import BotPerformer
+from .human_performer import HumanPerformer
+from .logging import warn
+
+class Job:
+    """
+    A generation request run on a worker thread.
+    """
+
+    job_id: str
+    job_type: str
+    session_id: str
+
+    # Performer requested by a request_dialogue job
+    character_idx: Optional[int] = None
+
+    # "queued", "running", "done", "failed" or "cancelled"
+    status: str = "queued"
+
+    result: Optional[dict] = None
+    error: Optional[str] = None
+
+    # time.perf_counter() when the job started running
+    start_time: Optional[float] = None
+
+    def __init__(self,
+                 job_type: str,
+                 session_id: str,
+                 character_idx: Optional[int] = None):
+        self.job_id = uuid.uuid4().hex
+        self.job_type = job_type
+        self.session_id = session_id
+        self.character_idx = character_idx
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "job_type": self.job_type,
+            "session_id": self.session_id,
+            "character_idx": self.character_idx,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+        }
+
+class QueueFullError(Exception):
+    """
+    Raised when a session has too many queued jobs.
+    """
+
+    # Seconds after which the request is worth retrying
+    retry_after: float
+
+    def __init__(self, session_id: str, retry_after: float):
+        super().__init__(f"session {session_id} job queue is full")
+        self.retry_after = retry_after
+
+class Session:
+    """
+    A performance hosted by the server.
+    """
+
+    session_id: str
+
+    # None until the session's create job has run
+    performance: Optional[Performance] = None
+
+    # Set when the create job fails; the session is then removed
+    failed: bool = False
+
+    # Held by whatever is using the performance (job workers, STT input)
+    performance_lock: threading.Lock
+
+    # Play objects already handed to a playback watcher thread
+    watched_play_objs: list
+
+    # Jobs waiting to run, as a heap of (priority, sequence number, Job,
+    # function)
+    queued_jobs: list
+
+    # Job running on a worker thread, if any
+    running_job: Optional[Job] = None
+
+    # Moving average of job run time in seconds, for retry_after hints
+    average_job_seconds: float = 1.0
+
+    # Publish synthesized audio after each generated line
+    stream_audio: bool = False
+
+    # Rendered script, length and performer names as of the last
+    # update_snapshot(), so the event loop can answer without taking
+    # performance_lock
+    script: str = ""
+    length: int = 0
+    performer_names: list
+
+    def __init__(self,
+                 session_id: str,
+                 performance: Optional[Performance] = None,
+                 stream_audio: bool = False):
+        self.session_id = session_id
+        self.performance = performance
+        self.stream_audio = stream_audio
+        self.performance_lock = threading.Lock()
+        self.watched_play_objs = []
+        self.queued_jobs = []
+        self.performer_names = []
+
+    def update_snapshot(self):
+        """
+        Copy what the event loop reports from the performance; call holding
+        performance_lock.
+        """
+
+        self.script = self.performance.get_script()
+        self.length = len(self.performance.working_script)
+        self.performer_names = list(self.performance.performers)
+
+    def to_dict(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "ready": self.performance is not None,
+            "performers": self.performer_names,
+            "length": self.length,
+            "queued_jobs": len(self.queued_jobs),
+        }
 
 #@TODO move to separate package?
 class Server:
+    context: zmq.Context
     socket: zmq.Socket
-    performance: Performance
+
+    # Sessions by session_id
+    sessions: Dict[str, Session]
+
+    # Session used by messages without a session_id, and for STT input
+    default_session_id: str = "default"
+
+    # Sessions other than the default one log to a subdirectory named after
+    # their session_id
+    sessions_logdir: str
+
+    # TTS engine, shared by every session
+    tts = None
+
+    # Publishes job progress and completion, and generated lines and audio
+    pub_socket: zmq.Socket
+    pub_address: str = "tcp://*:5556"
+
+    # Bytes of PCM audio per published audio frame
+    audio_chunk_size: int = 32 * 1024
+
+    # Receives events from other threads (see send_event())
+    event_socket: zmq.Socket
+    event_address: str = "inproc://bot-aukerman-events"
+
+    poller: zmq.Poller
+    running: bool = False
+
+    # Worker threads for jobs
+    executor: ThreadPoolExecutor
+    num_workers: int = 4
+
+    # Thread synthesizing streamed audio, off the generation path; a single
+    # thread because sessions share one TTS engine
+    synthesis_executor: ThreadPoolExecutor
+
+    # Jobs by job_id; the oldest finished jobs are forgotten beyond
+    # max_jobs
+    jobs: OrderedDict
+    max_jobs: int = 256
+
+    # Priority of each job type; lower runs first
+    job_priorities: dict = {
+        "create_session": 0,
+        "observe_speech": 1,
+        "observe_user_input": 1,
+        "request_dialogue": 2,
+    }
+
+    # Priority of requests received together, by message type; lower is
+    # handled first
+    message_priorities: dict = {
+        "interrupt": 0,
+        "observe_user_input": 1,
+    }
+    default_message_priority: int = 2
+
+    # Maximum number of jobs queued per session (not counting the running
+    # one)
+    max_queued_jobs: int = 8
+
+    # Orders jobs of equal priority by submission
+    job_sequence: itertools.count
+
+    # Seconds between STT polls when no speech was recognized
+    #@REVISIT VoskImp only offers polling
+    stt_poll_interval: float = 0.05
 
     # Currently playing audio object
     # active_play_obj: Optional[sa.PlayObject] = None
 
     def __init__(self):
         # Init ZMQ socket
-        context = zmq.Context()
-        self.socket = context.socket(zmq.REP)
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.ROUTER)
         self.socket.bind("tcp://*:5555")
 
+        self.pub_socket = self.context.socket(zmq.PUB)
+        self.pub_socket.bind(self.pub_address)
+
+        # Init event socket for other threads
+        self.event_socket = self.context.socket(zmq.PULL)
+        self.event_socket.bind(self.event_address)
+        self.thread_event_sockets = threading.local()
+
+        self.poller = zmq.Poller()
+        self.poller.register(self.socket, zmq.POLLIN)
+        self.poller.register(self.event_socket, zmq.POLLIN)
+
+        self.sessions = {}
+        self.sessions_logdir = os.path.join(
+                appdirs.user_log_dir("bot-aukerman", "bot-aukerman"),
+                "sessions")
+
+        self.executor = ThreadPoolExecutor(max_workers = self.num_workers,
+                                           thread_name_prefix = "bot-aukerman-worker")
+        self.synthesis_executor = ThreadPoolExecutor(
+                max_workers = 1,
+                thread_name_prefix = "bot-aukerman-synthesis")
+        self.jobs = OrderedDict()
+        self.job_sequence = itertools.count()
+
+    @property
+    def performance(self) -> Performance:
+        """
+        The default session's performance.
+        """
+
+        return self.sessions[self.default_session_id].performance
+
     def start(self):
-        # Init Performance
-        self.performance = Performance()
-        self.performance.initialize_tts()
-        self.performance.initialize_stt()
+        # Init default session's Performance
+        performance = Performance()
+        performance.initialize_tts()
+        performance.initialize_stt()
+
+        self.tts = performance.tts
+        session = Session(self.default_session_id, performance)
+        session.update_snapshot()
+        self.sessions[self.default_session_id] = session
+
+        self.running = True
+
+        # Watch for speech in a separate thread
+        if self.performance.stt:
+            threading.Thread(target = self.watch_stt,
+                             name = "bot-aukerman-stt-watcher",
+                             daemon = True).start()
 
         print("bot-aukerman server started")
 
-        while(True):
-            time.sleep(0.2)
+        while(self.running):
+            # Sleep until a request or event arrives
+            ready_sockets = dict(self.poller.poll())
+
+            if self.socket in ready_sockets:
+                self.handle_requests()
+
+            if self.event_socket in ready_sockets:
+                self.handle_events()
+
+        self.executor.shutdown(wait = False, cancel_futures = True)
+        self.synthesis_executor.shutdown(wait = False, cancel_futures = True)
+        self.socket.close()
+        self.pub_socket.close()
+        self.event_socket.close()
+
+    def stop(self):
+        """
+        Stop the event loop (from any thread).
+        """
 
-            # Get any socket data (requests from other processes):
+        self.send_event({ "type": "stop" })
+
+    def handle_requests(self):
+        """
+        Receive every waiting client request, and handle them in order of
+        message_priorities.
+        """
+
+        requests = []
+
+        while True:
             try:
-                message = self.socket.recv_json(flags=zmq.NOBLOCK)
+                frames = self.socket.recv_multipart(flags=zmq.NOBLOCK)
+            except zmq.Again:
+                break
+
+            # Routing frames (and REQ clients' empty delimiter) go back with
+            # the reply
+            envelope, payload = frames[:-1], frames[-1]
+
+            # Malformed requests are answered first, with their error
+            try:
+                message = json.loads(payload)
                 assert isinstance(message, dict)
-                self.receive_message(message)
-            except zmq.ZMQError as e:
-                if e.errno == zmq.EAGAIN:
-                    pass
+
+                priority = self.message_priorities.get(
+                        message.get("type"), self.default_message_priority)
+            except Exception as e:
+                message = e
+                priority = 0
+
+            requests.append((priority, len(requests), envelope, message))
+
+        requests.sort(key = lambda request: request[:2])
+
+        for _, _, envelope, message in requests:
+            self.handle_request(envelope, message)
+
+        # Watch any audio the requests started playing
+        self.watch_playback()
+
+    def handle_request(self, envelope: list, message):
+        """
+        Handle a client request and reply.
+        """
+
+        reply = { "errors": None }
+
+        try:
+            if isinstance(message, Exception):
+                raise message
+
+            reply_data = self.receive_message(message)
+            if reply_data:
+                reply.update(reply_data)
+
+        except QueueFullError as e:
+            reply["errors"] = [str(e)]
+            reply["retry_after"] = e.retry_after
+
+        except Exception as e:
+            warn(f"failed to handle message: {e}")
+            reply["errors"] = [str(e)]
+
+        #  Send reply back to client
+        self.socket.send_multipart(envelope + [json.dumps(reply).encode()])
+
+    def handle_events(self):
+        """
+        Handle every event queued by other threads.
+        """
+
+        while True:
+            try:
+                frames = self.event_socket.recv_multipart(flags=zmq.NOBLOCK)
+            except zmq.Again:
+                break
+
+            event = json.loads(frames[0])
+
+            match event["type"]:
+                case "publish":
+                    self.publish(event["topic"], event["data"], *frames[1:])
+
+                case "job_finished":
+                    self.publish("job/" + event["job"]["job_id"], event["job"])
+                    self.watch_playback()
+
+                    # Run the session's next job; destroyed sessions have
+                    # no queue left
+                    session = self.sessions.get(event["job"]["session_id"])
+                    if session:
+                        session.running_job = None
+                        self.run_next_job(session)
+
+                case "speech":
+                    self.observe_speech(self.sessions[self.default_session_id],
+                                        event["text"])
+
+                case "playback_done":
+                    # The session may have been destroyed since
+                    session = self.sessions.get(event["session_id"])
+                    if session is None or session.performance is None:
+                        continue
+
+                    active_play_objs = \
+                            session.performance.remove_finished_play_objs()
+
+                    session.watched_play_objs = [
+                        play_obj for play_obj in session.watched_play_objs
+                        if play_obj in active_play_objs
+                    ]
+
+                case "session_failed":
+                    # Forget sessions whose performance couldn't be created
+                    session = self.sessions.get(event["session_id"])
+                    if session and session.performance is None:
+                        del self.sessions[event["session_id"]]
+                        self.cancel_queued_jobs(session, "session failed")
+
+                case "stop":
+                    self.running = False
+
+    def send_event(self, event: dict, payload: Optional[bytes] = None):
+        """
+        Send an event to the event loop, with an optional binary payload; may
+        be called from any thread.
+        """
+
+        # Sockets can't be shared between threads; keep one per thread
+        event_socket = getattr(self.thread_event_sockets, "socket", None)
+        if event_socket is None:
+            event_socket = self.context.socket(zmq.PUSH)
+            event_socket.connect(self.event_address)
+            self.thread_event_sockets.socket = event_socket
+
+        frames = [json.dumps(event).encode()]
+        if payload is not None:
+            frames.append(payload)
+
+        event_socket.send_multipart(frames)
+
+    def publish(self, topic: str, data: dict, payload: Optional[bytes] = None):
+        """
+        Publish data, and an optional binary frame after it, to subscribers of
+        topic (main thread only; other threads send a publish event).
+        """
+
+        frames = [topic.encode(), json.dumps(data).encode()]
+        if payload is not None:
+            frames.append(payload)
+
+        self.pub_socket.send_multipart(frames)
+
+    def publish_dialogue(self, session: Session, job: Job, dialogue: Dialogue):
+        """
+        Publish a generated line to its session's performer topic and, if the
+        session streams audio, queue its synthesis (from job workers).
+        """
+
+        topic = "session/{}/performer/{}/".format(
+                session.session_id, dialogue.character_name.upper())
+
+        self.send_event({
+            "type": "publish",
+            "topic": topic + "line/",
+            "data": {
+                "session_id": session.session_id,
+                "job_id": job.job_id,
+                "character_name": dialogue.character_name,
+                "dialogue": dialogue.dialogue,
+            },
+        })
+
+        if not session.stream_audio:
+            return
+
+        synthesize_speech = session.performance.prepare_synthesis(dialogue)
+        if synthesize_speech is None:
+            return
+
+        self.synthesis_executor.submit(self.publish_audio,
+                                       session.session_id,
+                                       job.job_id,
+                                       topic + "audio/",
+                                       synthesize_speech)
+
+    def publish_audio(self,
+                      session_id: str,
+                      job_id: str,
+                      topic: str,
+                      synthesize_speech: Callable[[], tuple]):
+        """
+        Synthesize a line and publish its audio in chunks (from the synthesis
+        thread).
+        """
+
+        try:
+            pcm, sample_rate = synthesize_speech()
+        except Exception as e:
+            warn(f"speech synthesis failed: {e}")
+            return
+
+        num_chunks = max(1, -(-len(pcm) // self.audio_chunk_size))
+
+        for chunk_index in range(num_chunks):
+            start = chunk_index * self.audio_chunk_size
+
+            self.send_event({
+                "type": "publish",
+                "topic": topic,
+                "data": {
+                    "session_id": session_id,
+                    "job_id": job_id,
+                    "chunk_index": chunk_index,
+                    "num_chunks": num_chunks,
+                    "sample_rate": sample_rate,
+                    "sample_width": 2,
+                    "channels": 1,
+                },
+            }, payload = pcm[start:start + self.audio_chunk_size])
+
+    def submit_job(self,
+                   session: Session,
+                   job_type: str,
+                   function,
+                   character_idx: Optional[int] = None) -> Job:
+        """
+        Queue function to run on a worker thread, holding the session's
+        performance lock. A session runs one job at a time, in order of
+        job_priorities; jobs of different sessions run concurrently.
+
+        function is passed the Job; what it returns is the job's result.
+        Raises QueueFullError if the session has max_queued_jobs waiting.
+        """
+
+        if len(session.queued_jobs) >= self.max_queued_jobs:
+            # The queue has room again once the running job finishes
+            retry_after = session.average_job_seconds
+            running_job = session.running_job
+            if running_job and running_job.start_time is not None:
+                elapsed = time.perf_counter() - running_job.start_time
+                retry_after = max(retry_after - elapsed, 0.05)
+
+            raise QueueFullError(session.session_id, round(retry_after, 2))
+
+        job = Job(job_type, session.session_id, character_idx)
+        self.jobs[job.job_id] = job
+        self.forget_old_jobs()
+
+        heapq.heappush(session.queued_jobs, (self.job_priorities[job_type],
+                                             next(self.job_sequence),
+                                             job,
+                                             function))
+        self.run_next_job(session)
+
+        return job
+
+    def run_next_job(self, session: Session):
+        """
+        Start the session's highest priority queued job, unless one is
+        already running (main thread only).
+        """
+
+        if session.running_job or not session.queued_jobs:
+            return
+
+        _, _, job, function = heapq.heappop(session.queued_jobs)
+        session.running_job = job
+
+        def run_job():
+            with session.performance_lock:
+                job.start_time = time.perf_counter()
+                job.status = "running"
+                self.send_event({
+                    "type": "publish",
+                    "topic": "job/" + job.job_id,
+                    "data": job.to_dict(),
+                })
+
+                try:
+                    job.result = function(job)
+                    job.status = "done"
+                except Exception as e:
+                    warn(f"job {job.job_id} failed: {e}")
+                    job.error = str(e)
+                    job.status = "failed"
+
+                if session.performance:
+                    session.update_snapshot()
+
+                session.average_job_seconds = \
+                        0.8 * session.average_job_seconds \
+                        + 0.2 * (time.perf_counter() - job.start_time)
+
+            self.send_event({ "type": "job_finished", "job": job.to_dict() })
+
+        self.executor.submit(run_job)
+
+    def cancel_job(self, job: Job, reason: str):
+        """
+        Mark a job taken off its session's queue as cancelled (main thread
+        only).
+        """
+
+        job.status = "cancelled"
+        job.error = reason
+        self.publish("job/" + job.job_id, job.to_dict())
+
+    def cancel_queued_jobs(self, session: Session, reason: str):
+        """
+        Cancel every job queued for a session that is going away.
+        """
+
+        for _, _, job, _ in session.queued_jobs:
+            self.cancel_job(job, reason)
+
+        session.queued_jobs = []
+
+    def coalesce_dialogue_requests(self, session: Session):
+        """
+        Cancel all but the newest of the session's queued request_dialogue
+        jobs for each character_idx; called when the human speaks, so the ones
+        left generate from the script with their line.
+        """
+
+        # Newest queued request by character_idx; sequence numbers increase
+        # with submission
+        newest_requests = {}
+        for queued_job in session.queued_jobs:
+            job = queued_job[2]
+            if job.job_type != "request_dialogue":
+                continue
+
+            newest = newest_requests.get(job.character_idx)
+            if newest is None or queued_job[1] > newest[1]:
+                newest_requests[job.character_idx] = queued_job
+
+        for queued_job in session.queued_jobs:
+            job = queued_job[2]
+            if job.job_type != "request_dialogue":
+                continue
+
+            newest = newest_requests[job.character_idx]
+            if queued_job is not newest:
+                self.cancel_job(job, "coalesced into job " + newest[2].job_id)
+
+        session.queued_jobs = [
+            queued_job for queued_job in session.queued_jobs
+            if queued_job[2].status == "queued"
+        ]
+        heapq.heapify(session.queued_jobs)
+
+    def forget_old_jobs(self):
+        finished_jobs = [
+            job_id for job_id, job in self.jobs.items()
+            if job.status in ("done", "failed", "cancelled")
+        ]
+
+        while len(self.jobs) > self.max_jobs and finished_jobs:
+            del self.jobs[finished_jobs.pop(0)]
+
+    def watch_stt(self):
+        """
+        Poll the STT engine and send recognized speech to the event loop.
+        """
+
+        stt = self.performance.stt
+        assert stt
+
+        while self.running:
+            text = stt.update()
+
+            if text:
+                self.send_event({ "type": "speech", "text": text })
             else:
-                #  Send reply back to client
-                reply = { "errors": None }
-                self.socket.send_json(reply)
+                time.sleep(self.stt_poll_interval)
+
+    def watch_playback(self):
+        """
+        Start a watcher thread for each new play object, which sends an event
+        when its audio finishes.
+        """
+
+        for session in self.sessions.values():
+            if session.performance is None:
+                continue
+
+            for play_obj in session.performance.get_active_play_objs():
+                if play_obj in session.watched_play_objs:
+                    continue
+
+                session.watched_play_objs.append(play_obj)
+
+                threading.Thread(target = self.wait_for_playback,
+                                 args = (session.session_id, play_obj),
+                                 name = "bot-aukerman-playback-watcher",
+                                 daemon = True).start()
+
+    def wait_for_playback(self, session_id: str, play_obj: sa.PlayObject):
+        play_obj.wait_done()
+        self.send_event({ "type": "playback_done", "session_id": session_id })
+
+    def observe_speech(self, session: Session, text: str,
+                       job_type: str = "observe_speech") -> Job:
+        """
+        Add speech recognized by STT (or typed input) to the performance as
+        human dialogue.
+        """
+
+        # Stop bots talking over the human right away
+        if session.performance:
+            session.performance.interrupt()
+
+        # Queued replies would be generated before the human's line
+        self.coalesce_dialogue_requests(session)
+
+        # Add dialogue once any running generation is done
+        def observe_human_dialogue(job: Job):
+            try:
+                session.performance.observe_human_dialogue(text)
+            except RuntimeError as e:
+                warn(f"{e}")
+
+        return self.submit_job(session, job_type, observe_human_dialogue)
+
+    def get_session(self, session_id: Optional[str] = None,
+                    ready: bool = True) -> Session:
+        """
+        Get a session by session_id, or the default session; with ready, the
+        session's performance must have been created.
+        """
+
+        if session_id is None:
+            session_id = self.default_session_id
+
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise ValueError(f"unknown session_id: {session_id}")
+
+        if session.failed:
+            raise ValueError(f"session {session_id} could not be created")
+
+        if ready and session.performance is None:
+            raise ValueError(f"session {session_id} is still being created")
+
+        return session
+
+    def receive_message(self, message: dict) -> Optional[dict]:
+        """
+        Handle a message; returns any data to add to the reply.
+        """
 
-    def receive_message(self, message: dict):
         print("server received message: ", message)
 
+        session_id = message.get("session_id")
+
         match message["type"]:
+            case "create_session":
+                return self.create_session(
+                        session_id = session_id,
+                        model_config = message.get("model_config"),
+                        performers = message.get("performers", []),
+                        scene = message.get("scene"),
+                        stream_audio = message.get("stream_audio", False))
+
+            case "list_sessions":
+                return self.list_sessions()
+
+            case "destroy_session":
+                return self.destroy_session(session_id)
+
+            case "get_script":
+                return self.get_script(self.get_session(session_id),
+                                       message.get("offset", 0))
+
+            case "get_job":
+                return self.get_job(message["job_id"])
+
             case "observe_user_input":
-                self.observe_user_input(message["user_input"])
+                return self.observe_user_input(self.get_session(session_id),
+                                               message["user_input"])
 
             case "request_dialogue":
-                self.request_dialogue(message["character_idx"])
+                return self.request_dialogue(self.get_session(session_id,
+                                                              ready = False),
+                                             message["character_idx"])
 
             case "interrupt":
-                self.interrupt()
+                self.interrupt(self.get_session(session_id))
 
     # def stop(self):
     #     pass
@@ -70,13 +832,198 @@ class Server:
     # def restart(self):
     #     pass
 
-    def observe_user_input(self, user_input: str):
-        self.performance.interrupt()
-        # self.active_play_obj = self.performance.perform_dialogue(user_input)
+    def create_session(
+        self,
+        session_id: Optional[str] = None,
+        model_config: Optional[dict] = None,
+        performers: list = [],
+        scene: Optional[str] = None,
+        stream_audio: bool = False,
+    ) -> dict:
+        """
+        Create a session; its performance is created by a job, since loading
+        a model not yet in the model registry takes a while.
+
+        performers is a list of dicts with character_name, and optionally
+        character_desc, model_config and human (True for a HumanPerformer).
+        With stream_audio, generated lines are followed by their synthesized
+        audio on the session's performer topics.
+        """
+
+        if session_id is None:
+            session_id = uuid.uuid4().hex
+
+        # session_id names the session's log directory
+        if not re.fullmatch(r"[A-Za-z0-9_-]+", session_id):
+            raise ValueError(f"invalid session_id: {session_id}")
+
+        if session_id in self.sessions:
+            raise ValueError(f"session {session_id} already exists")
+
+        session = Session(session_id, stream_audio = stream_audio)
+        self.sessions[session_id] = session
+
+        def create_performance(job: Job):
+            performance = None
+
+            try:
+                performance = Performance(
+                        logdir = os.path.join(self.sessions_logdir, session_id),
+                        model_config = model_config)
+
+                # Share the TTS engine rather than loading one per session
+                #@REVISIT CoquiImp may not be safe to use from concurrent jobs
+                performance.tts = self.tts
+
+                for performer in performers:
+                    if performer.get("human"):
+                        performance.add_performer(HumanPerformer(
+                            character_name = performer["character_name"],
+                            character_desc = performer.get("character_desc",
+                                                           "No description")))
+                    else:
+                        performance.add_performer(BotPerformer(
+                            character_name = performer["character_name"],
+                            character_desc = performer.get("character_desc",
+                                                           "No description"),
+                            model_config = performer.get("model_config")))
+
+                if scene:
+                    performance.set_scene(scene)
+
+            except Exception:
+                # Release the partly built performance's models
+                if performance is not None:
+                    performance.close()
+
+                session.failed = True
+                self.send_event({ "type": "session_failed",
+                                  "session_id": session_id })
+                raise
+
+            session.performance = performance
+            session.update_snapshot()
+
+            return session.to_dict()
+
+        job = self.submit_job(session, "create_session", create_performance)
+
+        return {
+            "session_id": session_id,
+            "job_id": job.job_id,
+            "status": job.status,
+        }
+
+    def list_sessions(self) -> dict:
+        return {
+            "sessions": [session.to_dict()
+                         for session in self.sessions.values()],
+        }
+
+    def destroy_session(self, session_id: Optional[str]) -> dict:
+        """
+        Remove a session; its performance is closed once any running job is
+        done.
+        """
+
+        if session_id is None or session_id == self.default_session_id:
+            raise ValueError("the default session can't be destroyed")
+
+        session = self.get_session(session_id, ready = False)
+        del self.sessions[session_id]
+
+        self.cancel_queued_jobs(session, "session destroyed")
+
+        if session.performance:
+            session.performance.interrupt()
+
+        def close_performance():
+            with session.performance_lock:
+                if session.performance:
+                    session.performance.close()
+
+        self.executor.submit(close_performance)
+
+        return { "session_id": session_id }
+
+    def observe_user_input(self, session: Session, user_input: str) -> dict:
+        """
+        Queue a job adding the user's input to the performance as human
+        dialogue.
+        """
+
+        job = self.observe_speech(session, user_input,
+                                  job_type = "observe_user_input")
+
+        return { "job_id": job.job_id, "status": job.status }
+
+    def request_dialogue(self, session: Session, character_idx: str) -> dict:
+        """
+        Queue a job generating dialogue; lines are published as they are
+        generated.
+        """
+
+        def generate_dialogue(job: Job):
+            # Queued while the session was being created, which then failed
+            if session.performance is None:
+                raise RuntimeError(f"session {session.session_id} has no "
+                                   + "performance")
+
+            def publish_progress(component):
+                self.send_event({
+                    "type": "publish",
+                    "topic": "job/" + job.job_id,
+                    "data": {
+                        "job_id": job.job_id,
+                        "status": "running",
+                        "component": component.to_str(),
+                    },
+                })
+
+                if isinstance(component, Dialogue):
+                    self.publish_dialogue(session, job, component)
+
+            dialogue = session.performance.generate_dialogue(
+                    character_idx = character_idx,
+                    on_component = publish_progress)
+
+            return { "lines": [component.to_str() for component in dialogue] }
+
+        job = self.submit_job(session, "request_dialogue", generate_dialogue,
+                              character_idx = character_idx)
+
+        return { "job_id": job.job_id, "status": job.status }
+
+    def get_job(self, job_id: str) -> dict:
+        """
+        Get a job's status and result.
+        """
+
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise ValueError(f"unknown job_id: {job_id}")
+
+        return job.to_dict()
+
+    def get_script(self, session: Session, offset: int = 0) -> dict:
+        """
+        Get the rendered script from character offset on; clients polling the
+        script can pass the length they already have to get only new text.
+
+        Served from the session's snapshot, which jobs update as they add to
+        the script.
+        """
+
+        script = session.script
+
+        return {
+            "script": script[offset:] if offset else script,
+            "length": len(script),
+        }
+
+    def interrupt(self, session: Session):
+        """
+        Stop any audio being played.
+        """
 
-    def request_dialogue(self, character_idx: str):
-        self.performance.generate_dialogue(character_idx = character_idx)
-    
-    # def interrupt(self):
-    #     if(self.active_play_obj):
-    #         self.active_play_obj.stop()
+        session.performance.interrupt()
@@ -0,0 +1,250 @@
+"""
+Compact binary snapshots of a performance's script, for fast resume.
+
+Layout (little-endian; strings are a u32 byte length followed by UTF-8):
+
+    magic "BAKS", u16 version
+    u64 journal offset (bytes of the history file the snapshot covers)
+    u32 name count, names
+    u32 component count, components:
+        u8 type code, then
+        SceneHeader: location_prefix, location, time strings
+        SceneAction: action string
+        Dialogue: u32 name index, dialogue string
+    u32 character_history count, u32 name indices
+    u32 chatbot_states count, u32 states
+"""
+
+import os
+import struct
+import threading
+from typing import Callable, List, Optional
+
+from .script_component import ScriptComponent
+from .scene_header import SceneHeader
+from .scene_action import SceneAction
+from .dialogue import Dialogue
+from .working_script import SCENE_HEADER, SCENE_ACTION, DIALOGUE
+from .logging import warn
+
+MAGIC = b"BAKS"
+VERSION = 1
+
+U8 = struct.Struct("<B")
+U16 = struct.Struct("<H")
+U32 = struct.Struct("<I")
+U64 = struct.Struct("<Q")
+
+class ScriptSnapshot:
+    # Bytes of the history file covered by the snapshot
+    journal_offset: int
+
+    working_script: List[ScriptComponent]
+    character_history: List[str]
+    chatbot_states: List[int]
+
+    def __init__(self,
+                 journal_offset: int,
+                 working_script: List[ScriptComponent],
+                 character_history: List[str],
+                 chatbot_states: List[int]):
+        self.journal_offset = journal_offset
+        self.working_script = working_script
+        self.character_history = character_history
+        self.chatbot_states = chatbot_states
+
+def write_snapshot(path: str, snapshot: ScriptSnapshot):
+    """
+    Write a snapshot to path, replacing any previous one atomically.
+    """
+
+    names: List[str] = []
+    name_indices: dict = {}
+
+    def name_index(name: str) -> int:
+        if name not in name_indices:
+            name_indices[name] = len(names)
+            names.append(name)
+
+        return name_indices[name]
+
+    def pack_str(string: str) -> bytes:
+        encoded = string.encode("utf-8")
+        return U32.pack(len(encoded)) + encoded
+
+    # Pack components first so the name table is complete
+    component_records = [U32.pack(len(snapshot.working_script))]
+    for component in snapshot.working_script:
+        match component.component_type:
+            case "dialogue":
+                component_records.append(U8.pack(DIALOGUE))
+                component_records.append(U32.pack(name_index(component.character_name)))
+                component_records.append(pack_str(component.dialogue))
+            case "scene_header":
+                component_records.append(U8.pack(SCENE_HEADER))
+                component_records.append(pack_str(component.location_prefix))
+                component_records.append(pack_str(component.location))
+                component_records.append(pack_str(component.time))
+            case "scene_action":
+                component_records.append(U8.pack(SCENE_ACTION))
+                component_records.append(pack_str(component.action))
+            case _:
+                raise TypeError(f"cannot snapshot {type(component)}")
+
+    history_records = [U32.pack(len(snapshot.character_history))]
+    for character_name in snapshot.character_history:
+        history_records.append(U32.pack(name_index(character_name)))
+
+    records = [MAGIC,
+               U16.pack(VERSION),
+               U64.pack(snapshot.journal_offset),
+               U32.pack(len(names))]
+    records.extend(pack_str(name) for name in names)
+    records.extend(component_records)
+    records.extend(history_records)
+    records.append(U32.pack(len(snapshot.chatbot_states)))
+    records.extend(U32.pack(state) for state in snapshot.chatbot_states)
+
+    # Write to temporary file first so a crash can't leave a partial snapshot
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(b"".join(records))
+
+    os.replace(temp_path, path)
+
+class SnapshotWriter:
+    """
+    Writes snapshots from a background thread, keeping their encoding and
+    file I/O off the generation path. If snapshots are submitted faster than
+    they are written, only the newest pending one is written.
+    """
+
+    # Running writer thread; None when idle
+    thread: Optional[threading.Thread] = None
+
+    # (path, function making the snapshot) waiting to be written
+    pending: Optional[tuple] = None
+
+    def __init__(self):
+        self.condition = threading.Condition()
+
+    def submit(self, path: str, make_snapshot: Callable[[], ScriptSnapshot]):
+        """
+        Queue a snapshot to be made (on the writer thread) and written to path.
+        """
+
+        with self.condition:
+            self.pending = (path, make_snapshot)
+
+            if self.thread is None:
+                self.thread = threading.Thread(
+                        target = self.run,
+                        name = "bot-aukerman-snapshot-writer",
+                        daemon = True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            with self.condition:
+                if self.pending is None:
+                    self.thread = None
+                    self.condition.notify_all()
+                    return
+
+                path, make_snapshot = self.pending
+                self.pending = None
+
+            try:
+                write_snapshot(path, make_snapshot())
+            except Exception as e:
+                warn(f"failed to write snapshot: {e}")
+
+    def wait(self):
+        """
+        Wait for pending snapshots to be written.
+        """
+
+        with self.condition:
+            while self.thread is not None:
+                self.condition.wait()
+
+    def cancel(self):
+        """
+        Drop any pending snapshot and wait for one being written to finish.
+        """
+
+        with self.condition:
+            self.pending = None
+
+        self.wait()
+
+def read_snapshot(path: str) -> ScriptSnapshot:
+    """
+    Read a snapshot written by write_snapshot().
+
+    Raises ValueError if the file is not a valid snapshot.
+    """
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    try:
+        return unpack_snapshot(data)
+    except struct.error as e:
+        raise ValueError(f"truncated snapshot: {path}") from e
+
+def unpack_snapshot(data: bytes) -> ScriptSnapshot:
+    if data[:4] != MAGIC:
+        raise ValueError("not a bot-aukerman snapshot")
+
+    offset = 4
+
+    def read(unpacker: struct.Struct):
+        nonlocal offset
+        value = unpacker.unpack_from(data, offset)[0]
+        offset += unpacker.size
+        return value
+
+    def read_str() -> str:
+        nonlocal offset
+        length = read(U32)
+        if offset + length > len(data):
+            raise ValueError("truncated snapshot string")
+
+        string = data[offset:offset + length].decode("utf-8")
+        offset += length
+        return string
+
+    version = read(U16)
+    if version != VERSION:
+        raise ValueError(f"unsupported snapshot version: {version}")
+
+    journal_offset = read(U64)
+
+    names = [read_str() for _ in range(read(U32))]
+
+    working_script: List[ScriptComponent] = []
+    for _ in range(read(U32)):
+        type_code = read(U8)
+
+        if type_code == DIALOGUE:
+            character_name = names[read(U32)]
+            working_script.append(Dialogue(character_name, read_str()))
+        elif type_code == SCENE_HEADER:
+            location_prefix = read_str()
+            location = read_str()
+            working_script.append(SceneHeader(location_prefix,
+                                              location,
+                                              read_str()))
+        elif type_code == SCENE_ACTION:
+            working_script.append(SceneAction(read_str()))
+        else:
+            raise ValueError(f"unknown component type code: {type_code}")
+
+    character_history = [names[read(U32)] for _ in range(read(U32))]
+    chatbot_states = [read(U32) for _ in range(read(U32))]
+
+    return ScriptSnapshot(journal_offset,
+                          working_script,
+                          character_history,
+                          chatbot_states)
@@ -0,0 +1,150 @@
+"""
+Validation of generated script components.
+
+Filters are registered once (per Performance) into a ValidationPipeline,
+which composes them into a single callable and keeps per-filter timing and
+reject counts.
+"""
+
+import re
+import time
+from typing import Callable, List, Optional
+
+from .script_component import ScriptComponent
+from .dialogue import Dialogue
+
+# Matches any alphabetical character
+ALPHABETICAL_REGEX = re.compile(r"[a-zA-Z]")
+
+class FilterStats:
+    name: str
+    component_filter: Callable[[ScriptComponent], bool]
+
+    # Number of components checked and rejected
+    calls: int = 0
+    rejects: int = 0
+
+    # Total time spent in filter, in seconds
+    total_time: float = 0.0
+
+    def __init__(self, name: str, component_filter: Callable):
+        self.name = name
+        self.component_filter = component_filter
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "rejects": self.rejects,
+            "total_time": self.total_time,
+        }
+
+class ValidationPipeline:
+    """
+    An ordered set of component filters composed into one callable.
+
+    A filter takes a ScriptComponent and returns whether it is valid; a
+    component is valid if it passes every filter.
+    """
+
+    filters: List[FilterStats]
+
+    # Composed filters; see compose()
+    validate: Callable[[ScriptComponent], bool]
+
+    def __init__(self, component_filters: List[Callable] = []):
+        self.filters = []
+
+        for component_filter in component_filters:
+            self.register(component_filter)
+
+        self.compose()
+
+    def register(self,
+                 component_filter: Callable[[ScriptComponent], bool],
+                 name: Optional[str] = None):
+        """
+        Add a filter to the pipeline; filters already registered are ignored.
+        """
+
+        for stats in self.filters:
+            if stats.component_filter == component_filter:
+                return
+
+        if name is None:
+            name = getattr(component_filter, "__name__", repr(component_filter))
+
+        self.filters.append(FilterStats(name, component_filter))
+        self.compose()
+
+    def unregister(self, component_filter: Callable[[ScriptComponent], bool]):
+        """
+        Remove a filter from the pipeline.
+        """
+
+        self.filters = [
+            stats for stats in self.filters
+            if stats.component_filter != component_filter
+        ]
+        self.compose()
+
+    def compose(self):
+        """
+        Build validate() from the registered filters.
+        """
+
+        filters = tuple(self.filters)
+        perf_counter = time.perf_counter
+
+        def validate(component: ScriptComponent) -> bool:
+            for stats in filters:
+                start_time = perf_counter()
+                valid = stats.component_filter(component)
+                stats.total_time += perf_counter() - start_time
+                stats.calls += 1
+
+                if not valid:
+                    stats.rejects += 1
+                    return False
+
+            return True
+
+        self.validate = validate
+
+    def __call__(self, component: ScriptComponent) -> bool:
+        return self.validate(component)
+
+    def get_stats(self) -> List[dict]:
+        """
+        Get call, reject and timing counts for each filter.
+        """
+
+        return [stats.to_dict() for stats in self.filters]
+
+def filter_non_alphabetical(component: ScriptComponent) -> bool: #@REVISIT naming
+    """
+    Filter out components with no alphabetical characters.
+
+    Parameters
+    ----------
+    component : ScriptComponent
+        The script component to filter.
+
+    Returns
+    -------
+    valid : bool
+        Whether the script component is valid.
+    """
+
+    text: str
+
+    if not isinstance(component, Dialogue):
+        # Check if component has any alphabetical characters
+        text = component.to_str()
+    else:
+        text = component.dialogue
+
+    if not ALPHABETICAL_REGEX.search(text):
+        return False
+
+    return True
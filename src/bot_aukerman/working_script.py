@@ -0,0 +1,495 @@
+"""
+Columnar storage for a performance's script.
+
+Rather than a list of component objects, WorkingScript keeps each component's
+type code, performer id and offset into a shared text arena in parallel
+arrays. Components are built on access, slices are views, and per-character
+queries (history, counts, last speaker) come from the same arrays so they
+can't fall out of sync with the script.
+
+Scripts can be forked in O(1): a fork reads the components it shares from its
+base script and stores only the components added after the fork.
+SharedPrefixList does the same for plain per-component lists kept alongside
+the script.
+"""
+
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .script_component import ScriptComponent
+from .scene_header import SceneHeader
+from .scene_action import SceneAction
+from .dialogue import Dialogue
+
+# Component type codes, also used in snapshot files; don't renumber
+SCENE_HEADER = 1
+SCENE_ACTION = 2
+DIALOGUE = 3
+
+TYPE_CODES = {
+    "scene_header": SCENE_HEADER,
+    "scene_action": SCENE_ACTION,
+    "dialogue": DIALOGUE,
+}
+
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+# Performer id of components without a performer
+NO_PERFORMER = -1
+
+class WorkingScript:
+    """
+    A script stored as parallel arrays.
+
+    Behaves like a read-only list of ScriptComponents (len(), iteration,
+    indexing and slicing) that is added to with append() and extend().
+    Components handed out are new objects; changing them doesn't change the
+    script.
+    """
+
+    # Script this one was forked from, and the number of its components (and
+    # Dialogue components) shared; the arrays below hold only later components
+    base: Optional["WorkingScript"] = None
+    base_length: int = 0
+    base_dialogue_count: int = 0
+
+    # Per component: type code, performer id and offset of first text field
+    type_codes: array
+    performer_ids: array
+    text_offsets: array
+
+    # Text fields of every component, in order
+    text_arena: List[str]
+
+    # Performer name table; performer ids index into it
+    performer_names: List[str]
+    performer_upper_names: List[str]
+    performer_ids_by_name: Dict[str, int]
+
+    # Performer id of each Dialogue component, in order
+    dialogue_performer_ids: array
+
+    # Number of Dialogue components by uppercase character name
+    character_counts: Dict[str, int]
+
+    def __init__(self, components: Iterable[ScriptComponent] = ()):
+        self.type_codes = array("B")
+        self.performer_ids = array("i")
+        self.text_offsets = array("Q")
+        self.text_arena = []
+
+        self.performer_names = []
+        self.performer_upper_names = []
+        self.performer_ids_by_name = {}
+
+        self.dialogue_performer_ids = array("i")
+        self.character_counts = {}
+
+        self.extend(components)
+
+    def append(self, component: ScriptComponent):
+        """
+        Add a component to the end of the script.
+        """
+
+        self.text_offsets.append(len(self.text_arena))
+
+        match component.component_type:
+            case "dialogue":
+                assert isinstance(component, Dialogue)
+                performer_id = self.get_performer_id(component.character_name)
+
+                self.type_codes.append(DIALOGUE)
+                self.performer_ids.append(performer_id)
+                self.text_arena.append(component.dialogue)
+
+                self.dialogue_performer_ids.append(performer_id)
+                upper_name = self.performer_upper_names[performer_id]
+                self.character_counts[upper_name] = \
+                        self.character_counts.get(upper_name, 0) + 1
+
+            case "scene_header":
+                assert isinstance(component, SceneHeader)
+                self.type_codes.append(SCENE_HEADER)
+                self.performer_ids.append(NO_PERFORMER)
+                self.text_arena.append(component.location_prefix)
+                self.text_arena.append(component.location)
+                self.text_arena.append(component.time)
+
+            case "scene_action":
+                assert isinstance(component, SceneAction)
+                self.type_codes.append(SCENE_ACTION)
+                self.performer_ids.append(NO_PERFORMER)
+                self.text_arena.append(component.action)
+
+            case _:
+                self.text_offsets.pop()
+                raise TypeError(f"cannot store {type(component)}")
+
+    def extend(self, components: Iterable[ScriptComponent]):
+        for component in components:
+            self.append(component)
+
+    def fork(self) -> "WorkingScript":
+        """
+        Make a script sharing this one's components so far.
+
+        Only the name table and character counts are copied. Components added
+        to either script afterwards aren't seen by the other.
+        """
+
+        script = WorkingScript()
+        script.base = self
+        script.base_length = len(self)
+        script.base_dialogue_count = self.get_dialogue_count()
+
+        script.performer_names = self.performer_names.copy()
+        script.performer_upper_names = self.performer_upper_names.copy()
+        script.performer_ids_by_name = self.performer_ids_by_name.copy()
+        script.character_counts = self.character_counts.copy()
+
+        return script
+
+    def truncated(self, length: int) -> "WorkingScript":
+        """
+        Get a script of this one's first length components.
+
+        A new script is returned (this one is unchanged, as forks may share
+        it); only components after the shared base are copied.
+        """
+
+        if length >= len(self):
+            return self
+
+        script = WorkingScript()
+        script.base = self.base
+
+        if length <= self.base_length:
+            script.base_length = length
+            script.base_dialogue_count = self.get_dialogue_count(length)
+        else:
+            own_length = length - self.base_length
+            type_codes = self.type_codes[:own_length]
+
+            script.base_length = self.base_length
+            script.base_dialogue_count = self.base_dialogue_count
+            script.type_codes = type_codes
+            script.performer_ids = self.performer_ids[:own_length]
+            script.text_offsets = self.text_offsets[:own_length]
+            script.text_arena = self.text_arena[:self.text_offsets[own_length]]
+            script.dialogue_performer_ids = \
+                    self.dialogue_performer_ids[:type_codes.count(DIALOGUE)]
+
+        if script.base is None:
+            script.base_length = 0
+
+        script.performer_names = self.performer_names.copy()
+        script.performer_upper_names = self.performer_upper_names.copy()
+        script.performer_ids_by_name = self.performer_ids_by_name.copy()
+
+        # Uncount the cut Dialogue components
+        script.character_counts = self.character_counts.copy()
+        for index in range(length, len(self)):
+            character_name = self.get_character_name(index)
+            if character_name is not None:
+                script.character_counts[character_name] -= 1
+
+        return script
+
+    def get_performer_id(self, character_name: str) -> int:
+        """
+        Get the id of a character name, adding it to the name table if new.
+        """
+
+        performer_id = self.performer_ids_by_name.get(character_name)
+
+        if performer_id is None:
+            performer_id = len(self.performer_names)
+            self.performer_names.append(character_name)
+            self.performer_upper_names.append(character_name.upper())
+            self.performer_ids_by_name[character_name] = performer_id
+
+        return performer_id
+
+    def build_component(self, index: int) -> ScriptComponent:
+        """
+        Build the component at (non-negative) index from the arrays.
+        """
+
+        if index < self.base_length:
+            assert self.base
+            return self.base.build_component(index)
+
+        index -= self.base_length
+        offset = self.text_offsets[index]
+        type_code = self.type_codes[index]
+
+        if type_code == DIALOGUE:
+            performer_id = self.performer_ids[index]
+            dialogue = Dialogue(self.performer_names[performer_id],
+                                self.text_arena[offset])
+            dialogue.upper_character_name = self.performer_upper_names[performer_id]
+            return dialogue
+
+        elif type_code == SCENE_HEADER:
+            return SceneHeader(self.text_arena[offset],
+                               self.text_arena[offset + 1],
+                               self.text_arena[offset + 2])
+
+        elif type_code == SCENE_ACTION:
+            return SceneAction(self.text_arena[offset])
+
+        raise ValueError(f"unknown component type code: {type_code}")
+
+    def get_component_type(self, index: int) -> str:
+        """
+        Get the component_type of the component at index, without building it.
+        """
+
+        if index < self.base_length:
+            assert self.base
+            return self.base.get_component_type(index)
+
+        return TYPE_NAMES[self.type_codes[index - self.base_length]]
+
+    def get_character_name(self, index: int) -> Optional[str]:
+        """
+        Get the uppercase character name of the component at index, if it is
+        Dialogue.
+        """
+
+        if index < self.base_length:
+            assert self.base
+            return self.base.get_character_name(index)
+
+        performer_id = self.performer_ids[index - self.base_length]
+        if performer_id == NO_PERFORMER:
+            return None
+
+        return self.performer_upper_names[performer_id]
+
+    def get_dialogue_count(self, length: Optional[int] = None) -> int:
+        """
+        Count the Dialogue components among the first length (by default all)
+        components.
+        """
+
+        if length is None:
+            return self.base_dialogue_count + len(self.dialogue_performer_ids)
+
+        if length <= self.base_length:
+            if self.base is None:
+                return 0
+
+            return self.base.get_dialogue_count(length)
+
+        own_length = length - self.base_length
+        return self.base_dialogue_count \
+                + self.type_codes[:own_length].count(DIALOGUE)
+
+    def get_character_history(self,
+                              length: Optional[int] = None) -> List[str]:
+        """
+        Get the uppercase character name of each of the first length (by
+        default all) Dialogue components, in order.
+        """
+
+        if length is None:
+            length = self.get_dialogue_count()
+
+        history = []
+        if self.base is not None:
+            history = self.base.get_character_history(
+                    min(length, self.base_dialogue_count))
+
+        upper_names = self.performer_upper_names
+        own_length = max(0, length - self.base_dialogue_count)
+        history.extend(upper_names[performer_id] for performer_id
+                       in self.dialogue_performer_ids[:own_length])
+
+        return history
+
+    def get_speaker(self, dialogue_index: int) -> str:
+        """
+        Get the uppercase character name of the dialogue_index-th Dialogue
+        component.
+        """
+
+        if dialogue_index < self.base_dialogue_count:
+            assert self.base
+            return self.base.get_speaker(dialogue_index)
+
+        dialogue_index -= self.base_dialogue_count
+        return self.performer_upper_names[self.dialogue_performer_ids[dialogue_index]]
+
+    def get_last_speaker(self) -> Optional[str]:
+        """
+        Get the uppercase character name of the last Dialogue component.
+        """
+
+        dialogue_count = self.get_dialogue_count()
+        if not dialogue_count:
+            return None
+
+        return self.get_speaker(dialogue_count - 1)
+
+    def count_lines(self, character_name: str) -> int:
+        """
+        Count the Dialogue components of a character.
+        """
+
+        return self.character_counts.get(character_name.upper(), 0)
+
+    def __len__(self) -> int:
+        return self.base_length + len(self.type_codes)
+
+    def __iter__(self) -> Iterator[ScriptComponent]:
+        for index in range(len(self)):
+            yield self.build_component(index)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return WorkingScriptSlice(self, *key.indices(len(self)))
+
+        if key < 0:
+            key += len(self)
+
+        if not 0 <= key < len(self):
+            raise IndexError("working script index out of range")
+
+        return self.build_component(key)
+
+    def __repr__(self) -> str:
+        return f"WorkingScript({len(self)} components)"
+
+class WorkingScriptSlice:
+    """
+    A view of components start to stop - 1 of a WorkingScript.
+    """
+
+    script: WorkingScript
+    start: int
+    stop: int
+
+    def __init__(self, script: WorkingScript, start: int, stop: int, step: int = 1):
+        if step != 1:
+            raise ValueError("working script slices don't support steps")
+
+        self.script = script
+        self.start = start
+        self.stop = max(start, stop)
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def __iter__(self) -> Iterator[ScriptComponent]:
+        for index in range(self.start, self.stop):
+            yield self.script.build_component(index)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            return WorkingScriptSlice(self.script,
+                                      self.start + start,
+                                      self.start + stop,
+                                      step)
+
+        if key < 0:
+            key += len(self)
+
+        if not 0 <= key < len(self):
+            raise IndexError("working script index out of range")
+
+        return self.script.build_component(self.start + key)
+
+class SharedPrefixList:
+    """
+    An append-only list that can be forked in O(1).
+
+    A fork reads its first base_length items from its base list and appends
+    to its own; the base may keep growing without the fork seeing it. Slicing
+    returns a plain list.
+    """
+
+    base: Optional["SharedPrefixList"] = None
+    base_length: int = 0
+
+    def __init__(self, items: Optional[list] = None):
+        self.items = items if items is not None else []
+
+    def fork(self) -> "SharedPrefixList":
+        shared_list = SharedPrefixList()
+        shared_list.base = self
+        shared_list.base_length = len(self)
+
+        return shared_list
+
+    def append(self, item):
+        self.items.append(item)
+
+    def extend(self, items: Iterable):
+        self.items.extend(items)
+
+    def truncated(self, length: int) -> "SharedPrefixList":
+        """
+        Get a list of this one's first length items, leaving this one (which
+        forks may share) unchanged.
+        """
+
+        if length >= len(self):
+            return self
+
+        shared_list = SharedPrefixList()
+        shared_list.base = self.base
+
+        if length <= self.base_length:
+            shared_list.base_length = length
+        else:
+            shared_list.base_length = self.base_length
+            shared_list.items = self.items[:length - self.base_length]
+
+        if shared_list.base is None:
+            shared_list.base_length = 0
+
+        return shared_list
+
+    def get_range(self, start: int, stop: int) -> list:
+        """
+        Get items start to stop - 1 (non-negative, within bounds) as a list.
+        """
+
+        if start >= self.base_length:
+            return self.items[start - self.base_length:stop - self.base_length]
+
+        assert self.base
+        items = self.base.get_range(start, min(stop, self.base_length))
+        if stop > self.base_length:
+            items.extend(self.items[:stop - self.base_length])
+
+        return items
+
+    def __len__(self) -> int:
+        return self.base_length + len(self.items)
+
+    def __iter__(self):
+        return iter(self.get_range(0, len(self)))
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                return self.get_range(0, len(self))[key]
+
+            return self.get_range(start, max(start, stop))
+
+        if key < 0:
+            key += len(self)
+
+        if key >= self.base_length:
+            return self.items[key - self.base_length]
+
+        if key < 0:
+            raise IndexError("list index out of range")
+
+        assert self.base
+        return self.base[key]
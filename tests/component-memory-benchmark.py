@@ -0,0 +1,67 @@
+import sys
+import time
+import tracemalloc
+
+from bot_aukerman.dialogue import Dialogue
+from bot_aukerman.scene_header import SceneHeader
+from bot_aukerman.scene_action import SceneAction
+
+# Number of script components to build
+num_components = 100000
+if len(sys.argv) > 1:
+    num_components = int(sys.argv[1])
+
+character_names = ["FROG", "HOMELESS MAN", "CAMMY", "TOAD"]
+
+# Unslotted components with per-instance names, as before __slots__
+class DictDialogue:
+    def __init__(self, character_name, dialogue):
+        self.character_name = character_name
+        self.dialogue = dialogue
+
+class DictSceneHeader:
+    def __init__(self, location_prefix, location, time):
+        self.location_prefix = location_prefix
+        self.location = location
+        self.time = time
+
+class DictSceneAction:
+    def __init__(self, action):
+        self.action = action
+
+def build_script(dialogue_class, header_class, action_class):
+    components = []
+
+    for index in range(num_components):
+        if index % 50 == 0:
+            components.append(header_class("EXT", "A PUBLIC PARK", "DAY"))
+        elif index % 10 == 0:
+            components.append(action_class(f"A FROG hops onto bench {index}."))
+        else:
+            # Build name fresh, as the interpreter does for each parsed line
+            character_name = "".join(character_names[index % 4])
+            components.append(dialogue_class(character_name,
+                                             f"Line number {index}."))
+
+    return components
+
+def measure(label, dialogue_class, header_class, action_class):
+    tracemalloc.start()
+    start_time = time.perf_counter()
+
+    components = build_script(dialogue_class, header_class, action_class)
+
+    elapsed_time = time.perf_counter() - start_time
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{label}: {size / 1024 / 1024:.1f} MiB "
+          + f"({size / len(components):.0f} bytes/component), "
+          + f"built in {elapsed_time:.2f}s")
+
+    return size
+
+print(f"Building {num_components} components…")
+dict_size = measure("__dict__ components", DictDialogue, DictSceneHeader, DictSceneAction)
+slot_size = measure("slotted components", Dialogue, SceneHeader, SceneAction)
+print(f"Slotted components use {slot_size / dict_size:.0%} of the memory.")
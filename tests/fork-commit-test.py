@@ -0,0 +1,48 @@
+import sys
+import time
+import contextlib
+import io
+
+from bot_aukerman import Performance
+from bot_aukerman.interpreter import Interpreter
+from bot_aukerman.context_window import ContextWindow, approximate_token_count
+
+# Number of fork/commit cycles; long shows commit thousands of forks
+num_cycles = 3000
+if len(sys.argv) > 1:
+    num_cycles = int(sys.argv[1])
+
+Interpreter.verbose = False
+
+with contextlib.redirect_stdout(io.StringIO()):
+    performance = Performance(logdir = "/tmp/bot-aukerman-fork-commit-test")
+
+performance.context_windows[0] = ContextWindow(performance,
+                                               approximate_token_count)
+
+start_time = time.perf_counter()
+for cycle in range(num_cycles):
+    fork = performance.fork()
+    fork.add_components(Interpreter.interpret(f"FROG\nLine number {cycle}."))
+
+    # Count the new line in the fork's window before committing
+    fork.context_windows[0].update()
+
+    performance.commit(fork)
+elapsed = time.perf_counter() - start_time
+
+# Committed windows must not chain onto earlier forks' lists
+window = performance.context_windows[0]
+assert window.token_offsets.base is None
+assert window.scene_header_indices.base is None
+
+# and must count the same as a window built from scratch
+fresh_window = ContextWindow(performance, approximate_token_count)
+fresh_window.update()
+assert list(window.token_offsets) == list(fresh_window.token_offsets)
+
+assert len(performance.working_script) == num_cycles
+
+performance.close()
+
+print(f"Committed {num_cycles} forks in {elapsed:.3f}s")
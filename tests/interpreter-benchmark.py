@@ -0,0 +1,93 @@
+import sys
+import re
+import time
+import contextlib
+import io
+
+from bot_aukerman.interpreter import Interpreter
+from bot_aukerman.scene_header import SceneHeader
+from bot_aukerman.scene_action import SceneAction
+from bot_aukerman.logging import warn
+
+class MultiPassInterpreter(Interpreter):
+    """
+    Interpreter classifying lines the way it did before classify_line():
+    trying each component type in turn and catching the ValueError of each
+    that doesn't match.
+    """
+
+    def classify_line(self, line):
+        # Attempt to parse as scene header
+        try:
+            location_prefix_regex = re.compile(r"^(INT|EXT)\.?\s")
+            location_prefix_match = location_prefix_regex.search(line)
+            if(not location_prefix_match):
+                raise ValueError("no location prefix found in header_string: " \
+                                 + line)
+
+            return ("scene_header",
+                    SceneHeader.from_prefix_match(line, location_prefix_match))
+        except ValueError as e:
+            warn(f"{e}")
+
+        # Attempt to parse as single line dialogue
+        try:
+            return ("dialogue", self.parse_single_line_dialogue(line))
+        except ValueError as e:
+            warn(f"{e}")
+
+        try:
+            return ("scene_action", SceneAction.from_str(line))
+        except ValueError as e:
+            warn(f"{e}")
+
+        return ("character_name", None)
+
+# Number of script lines to interpret
+num_lines = 20000
+if len(sys.argv) > 1:
+    num_lines = int(sys.argv[1])
+
+# Build a script mixing headers, actions, single and multi-line dialogue
+script_lines = []
+while len(script_lines) < num_lines:
+    script_lines += [
+        "EXT. A PUBLIC PARK - DAY",
+        "",
+        "An odd blue FROG is sitting on a bench.",
+        "",
+        "FROG",
+        "Well, well, well, hello there (smirks) mister human.",
+        "",
+        "HOMELESS MAN",
+        "Huh?",
+        "Who are you?",
+        "",
+        "Frog: Isn't it obvious?",
+        "",
+    ]
+script_str = "\n".join(script_lines[:num_lines])
+
+# Silence interpreter debug output so we only time parsing
+Interpreter.verbose = False
+
+def time_interpreter(interpreter_class):
+    start_time = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        components = interpreter_class.interpret(script_str)
+    elapsed = time.perf_counter() - start_time
+
+    print(f"{interpreter_class.__name__}: interpreted {num_lines} lines into " \
+          + f"{len(components)} components in {elapsed:.3f}s " \
+          + f"({num_lines / elapsed:,.0f} lines/s)")
+
+    return components, elapsed
+
+multi_pass_components, multi_pass_elapsed = time_interpreter(MultiPassInterpreter)
+components, elapsed = time_interpreter(Interpreter)
+
+# Both must read the script the same way
+assert [component.to_str() for component in components] \
+        == [component.to_str() for component in multi_pass_components]
+
+print(f"Speedup: {multi_pass_elapsed / elapsed:.1f}x")
@@ -0,0 +1,24 @@
+from bot_aukerman.interpreter import Interpreter
+
+Interpreter.verbose = False
+
+interpreter = Interpreter.start_stream()
+
+components = interpreter.feed("FROG\nHello there")
+assert components == []
+
+# The trailing line is only emitted by the first close()
+components = interpreter.close()
+assert len(components) == 1
+assert components[0].character_name == "FROG"
+assert components[0].dialogue == "Hello there"
+
+assert interpreter.close() == []
+
+# A closed interpreter can take a new stream
+components = interpreter.feed("TOAD\nHi.\n\n")
+assert len(components) == 1
+assert components[0].character_name == "TOAD"
+assert interpreter.close() == []
+
+print("Interpreter closes once")
@@ -0,0 +1,35 @@
+import os
+import tempfile
+
+from bot_aukerman.script_file import iter_file_lines
+
+# Each line ending must read the same as open() in text mode does
+samples = [
+    b"FROG\nHello.\n\nTOAD\nHi.\n",
+    b"FROG\r\nHello.\r\n\r\nTOAD\r\nHi.\r\n",
+    b"FROG\rHello.\r\rTOAD\rHi.\r",
+    b"FROG\r\nHello.\r\rTOAD\nHi.",
+    b"",
+]
+
+with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, "script.txt")
+
+    for sample in samples:
+        with open(path, "wb") as f:
+            f.write(sample)
+
+        with open(path, encoding = "utf-8") as f:
+            expected_lines = f.read().split("\n")
+
+        lines = list(iter_file_lines(path))
+        assert lines == expected_lines, (sample, lines, expected_lines)
+
+    # Reading from an offset starts at that byte
+    with open(path, "wb") as f:
+        f.write(b"FROG\r\nHello.\r\n\r\nTOAD\rHi.")
+
+    assert list(iter_file_lines(path, offset = 6)) \
+            == ["Hello.", "", "TOAD", "Hi."]
+
+print("Line endings read the same as text mode")